@@ -8,6 +8,9 @@ from . import bron_shotgrid, bron_paths
 reload(bron_shotgrid)
 reload(bron_paths)
 
+# parent character fields pulled through the sg_parent link along with the character itself
+parent_fields = [f'sg_parent.Asset.{i}' for i in bron_shotgrid.get_fields('Asset', 'rig')]
+
 # ##-------------------------------------------------------------------------------------- ## #
 # ##--- Helper functions ----------------------------------------------------------------- ## #
 
@@ -21,10 +24,16 @@ def get_parent_char(prj, sg_char_info):
 
     # if we don't have a parent set up return itself
     # else return the details of the parent asset
-    if not sg_char_info['sg_parent']:
+    parent = sg_char_info['sg_parent']
+
+    if not parent:
         return sg_char_info
-    else:
-        return bron_shotgrid.get_entity(prj, 'Asset', sg_id=sg_char_info['sg_parent']['id'])
+
+    # the parent fields came back with the character so there is no need to query it again
+    if all(i.rpartition('.')[-1] in parent for i in parent_fields):
+        return parent
+
+    return bron_shotgrid.get_entity(prj, 'Asset', sg_id=parent['id'])
 
 
 def _update_perforce_folder(path, p4v_user, workspace):
@@ -266,8 +275,11 @@ def import_character(prj, char, create_skel=False):
     """
     sync_rig_offline(prj, char)
 
-    # get sg data for our character
-    sg_chr_info = bron_shotgrid.get_entity(prj, 'Asset', additional_filters=[['sg_asset_1', 'is', char]])
+    # get sg data for our character along with the parent character details
+    sg_chr_info = bron_shotgrid.get_entity(prj,
+                                           'Asset',
+                                           additional_fields=parent_fields,
+                                           additional_filters=[['sg_asset_1', 'is', char]])
 
     # make sure we get something back
     if not sg_chr_info:
@@ -1,4 +1,23 @@
+import asyncio
+import atexit
+import copy
+import functools
+import json
 import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import weakref
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 import shotgun_api3
 from importlib import *
@@ -6,14 +25,1554 @@ from . import bron_paths
 
 sg = shotgun_api3.Shotgun(#deleted)
 
-entity_fields = dict(Playlist=['versions'],
-                     Version=['sg_path_to_movie', 'sg_uploaded_movie', 'code'],
-                     Episode=['code', 'id'],
-                     Shot=['sg_source_timecode_in', 'sg_handles', 'sg_edit_timecode_in', 'sg_edit_timecode_out',
+# default fields returned for each entity type. These are tuples so they can't be changed by callers,
+# use get_fields to build a field list for a query
+entity_fields = dict(Playlist=('versions',),
+                     Version=('sg_path_to_movie', 'sg_uploaded_movie', 'code'),
+                     Episode=('code', 'id'),
+                     Shot=('sg_source_timecode_in', 'sg_handles', 'sg_edit_timecode_in', 'sg_edit_timecode_out',
                            'sg_cut_in', 'sg_cut_out', 'sg_status_list', 'sg_shot_group', 'sg_preroll', 'assets',
-                           'code', 'project'],
-                     Scene=['shots', 'code'],
-                     Asset=['code', 'sg_asset_1', 'sg_asset_type', 'sg_parent', 'sg_ue_skeletonpath'])
+                           'code', 'project'),
+                     Scene=('shots', 'code'),
+                     Asset=('code', 'sg_asset_1', 'sg_asset_type', 'sg_parent', 'sg_ue_skeletonpath'))
+
+# named field presets for each entity type. 'default' always points at entity_fields
+field_presets = dict(Shot=dict(cut=('code', 'sg_cut_in', 'sg_cut_out', 'sg_handles', 'sg_preroll',
+                                    'sg_edit_timecode_in', 'sg_edit_timecode_out', 'sg_status_list')),
+                     Version=dict(movie=('code', 'sg_path_to_movie', 'sg_uploaded_movie')),
+                     Asset=dict(rig=('code', 'sg_asset_1', 'sg_asset_type', 'sg_ue_skeletonpath')))
+
+# running totals of how much data each preset has pulled back, keyed by (entity, preset)
+preset_stats = {}
+
+# maximum number of ids we send through in a single 'in' filter
+id_chunk_size = 500
+
+# field on Scene entities that links them to their Episode
+episode_link_field = 'sg_episode'
+
+# fields held in the local snapshot on top of the default fields so common filters can be answered locally
+snapshot_fields = dict(Shot=('sg_scene',),
+                       Scene=(episode_link_field,),
+                       Version=('entity', 'sg_pipeline_step', 'sg_department', 'sg_version_number'))
+
+# how long (in seconds) query results are cached for each entity type. Anything not listed uses the
+# default ttl on the cache
+cache_ttls = dict(Step=3600,
+                  HumanUser=3600,
+                  Project=3600,
+                  Episode=600,
+                  Scene=300,
+                  Asset=300,
+                  Shot=120,
+                  Playlist=30,
+                  Version=30)
+
+
+# ##------------------------------------------------## #
+# Helper Functions
+# ##------------------------------------------------## #
+def _chunks(items, size):
+    """
+    Splits a list up into chunks of a given size
+
+    :param items: (list) Items we want to split up
+    :param size: (int) Max number of items in each chunk
+    :return: (generator) Lists of items no bigger than size
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ##------------------------------------------------## #
+# Connection Pool
+# ##------------------------------------------------## #
+class ShotgunPool:
+    """
+    Bounded pool of Shotgun connections so several threads can talk to Shotgrid at once. A single
+    connection isn't thread safe so each call borrows a connection for its duration. Threads get back
+    the connection they used last when it is free, and nested borrows on the same thread reuse the
+    connection already held. Calling Shotgun methods on the pool itself borrows a connection for that call.
+    """
+    def __init__(self, client, max_size=8):
+        """
+        :param client: (Shotgun) Connection to use as the template for any new connections
+        :param max_size: (int) Max number of connections the pool will open
+        """
+        self.template = client
+        self.max_size = max_size
+
+        self._idle = [client]
+        self._created = 1
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        attr = getattr(self.template, name)
+
+        if not callable(attr):
+            return attr
+
+        def borrowed(*args, **kwargs):
+            with self.client() as client:
+                return getattr(client, name)(*args, **kwargs)
+
+        return borrowed
+
+    @contextmanager
+    def client(self):
+        """
+        Borrows a connection from the pool, waiting for one to come free if they are all in use
+
+        :return: (Shotgun) connection that belongs to this thread until the with block exits
+        """
+        held = getattr(self._local, 'held', None)
+
+        # if this thread already has a connection keep using it
+        if held:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        client = self._checkout()
+        self._local.held = client
+        self._local.depth = 1
+
+        try:
+            yield client
+        finally:
+            self._local.held = None
+            self._local.last = client
+            self._checkin(client)
+
+    def stats(self):
+        """
+        :return: (dict) Number of connections open, idle and the max size of the pool
+        """
+        with self._cond:
+            return dict(open=self._created, idle=len(self._idle), max_size=self.max_size)
+
+    def _checkout(self):
+        """
+        Takes a connection out of the pool, opening a new one if we have room
+
+        :return: (Shotgun) connection
+        """
+        last = getattr(self._local, 'last', None)
+
+        with self._cond:
+            while True:
+                # prefer the connection this thread used last
+                if last is not None and last in self._idle:
+                    self._idle.remove(last)
+                    return last
+
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._created < self.max_size:
+                    self._created += 1
+                    break
+
+                self._cond.wait()
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, client):
+        """
+        Puts a connection back into the pool
+
+        :param client: (Shotgun) connection to return
+        """
+        with self._cond:
+            self._idle.append(client)
+            self._cond.notify()
+
+    def _connect(self):
+        """
+        Opens a new connection with the same settings as our template connection
+
+        :return: (Shotgun) new connection
+        """
+        config = self.template.config
+
+        # only pass the credentials the template was built with. Downloads store a session token on the
+        # config and Shotgun won't accept one alongside script or login credentials
+        if config.script_name or config.api_key:
+            credentials = dict(script_name=config.script_name, api_key=config.api_key)
+        elif config.user_login or config.user_password:
+            credentials = dict(login=config.user_login, password=config.user_password)
+        else:
+            credentials = dict(session_token=config.session_token)
+
+        return shotgun_api3.Shotgun(self.template.base_url,
+                                    http_proxy=config.raw_http_proxy,
+                                    sudo_as_login=config.sudo_as_login,
+                                    convert_datetimes_to_utc=config.convert_datetimes_to_utc,
+                                    ca_certs=getattr(self.template, '_Shotgun__ca_certs', None),
+                                    connect=False,
+                                    **credentials)
+
+
+sg_pool = ShotgunPool(sg)
+
+
+def borrow_client():
+    """
+    Borrows a connection from the pool for several calls in a row
+
+        with borrow_client() as client:
+            client.find(...)
+
+    :return: (contextmanager) yields a Shotgun connection
+    """
+    return sg_pool.client()
+
+
+# ##------------------------------------------------## #
+# Request Scheduler
+# ##------------------------------------------------## #
+class RequestScheduler:
+    """
+    Keeps our Shotgrid requests inside a requests per second budget using a token bucket. Calls made in
+    the interactive lane always go ahead of calls in the batch lane so editor tools stay responsive while
+    overnight jobs run. Throttled or failed requests are retried with jittered exponential backoff and
+    slow reads can optionally be hedged with a second request on another connection.
+    """
+    # Shotgun methods that go through the scheduler, anything else is passed straight through
+    methods = ('find', 'find_one', 'summarize', 'create', 'update', 'delete', 'revive', 'batch',
+               'upload', 'download_attachment')
+
+    # methods that are safe to send twice when hedging
+    read_methods = ('find', 'find_one', 'summarize')
+
+    # http status codes we treat as the site asking us to slow down
+    retry_codes = (429, 502, 503, 504)
+
+    # status codes where the request was turned away before it was processed. Only these are safe to
+    # retry for writes, a 502/504 may come back after the write has already gone through
+    rejected_codes = (429, 503)
+
+    def __init__(self, client, rate=20, burst=40, max_retries=4, backoff=0.5, max_backoff=30, hedge_after=None):
+        """
+        :param client: (ShotgunPool) Connection or pool to send requests to
+        :param rate: (float) Requests per second we allow. None turns off rate limiting
+        :param burst: (int) Max number of requests that can go through at once after a quiet period
+        :param max_retries: (int) Number of times a throttled request is retried
+        :param backoff: (float) Seconds to wait before the first retry, doubled for each retry after
+        :param max_backoff: (float) Max seconds to wait between retries
+        :param hedge_after: (float) If set, reads that take longer than this many seconds get a second
+                            request sent and whichever answers first is used
+        """
+        self._client = client
+
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._hedge_executor = None
+
+        self.retries = 0
+        self.hedges = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+
+        if name not in self.methods or not callable(attr):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            return self._call(name, args, kwargs)
+
+        return scheduled
+
+    @contextmanager
+    def lane(self, lane):
+        """
+        Runs any Shotgrid calls made on this thread inside the with block in the given lane
+
+        :param lane: (str) 'interactive' or 'batch'
+        """
+        previous = getattr(self._local, 'lane', 'interactive')
+        self._local.lane = lane
+        try:
+            yield
+        finally:
+            self._local.lane = previous
+
+    def thread_wait(self):
+        """
+        Gets how long the current thread has spent waiting on the token bucket and backing off between
+        retries. Take the difference before and after a call to split queueing time from network time
+
+        :return: (float) Seconds this thread has spent waiting so far
+        """
+        return getattr(self._local, 'wait', 0.0)
+
+    def stats(self):
+        """
+        :return: (dict) Tokens available, interactive calls waiting, retries and hedged requests so far
+        """
+        with self._cond:
+            self._refill()
+            return dict(tokens=self._tokens,
+                        interactive_waiting=self._interactive_waiting,
+                        retries=self.retries,
+                        hedges=self.hedges)
+
+    def _refill(self):
+        """
+        Adds tokens to the bucket for the time that has passed. Must be called holding the lock
+        """
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _acquire(self):
+        """
+        Waits until there is budget for a request. Batch calls hold back while any interactive calls are waiting
+        """
+        if not self.rate:
+            return
+
+        interactive = getattr(self._local, 'lane', 'interactive') == 'interactive'
+        start = time.monotonic()
+
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+
+            try:
+                while True:
+                    self._refill()
+
+                    if self._tokens >= 1 and (interactive or not self._interactive_waiting):
+                        self._tokens -= 1
+                        return
+
+                    # wait for the next token to come in
+                    self._cond.wait(max((1 - self._tokens) / self.rate, 0.005))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+                self._local.wait = self.thread_wait() + time.monotonic() - start
+
+    def _retryable(self, name, error):
+        """
+        Checks if an error looks like the site throttling us or being temporarily unavailable. Writes are
+        only retried if the site turned them away before processing them
+
+        :param name: (str) Shotgun method name
+        :param error: (Exception) Error raised by the request
+        :return: (bool) True if we should retry
+        """
+        codes = self.retry_codes if name in self.read_methods else self.rejected_codes
+        if getattr(error, 'errcode', None) in codes:
+            return True
+
+        message = str(error).lower()
+        return 'rate limit' in message or 'too many requests' in message
+
+    def _call(self, name, args, kwargs):
+        """
+        Runs a request inside our budget, retrying if we get throttled
+
+        :param name: (str) Shotgun method name
+        :return: whatever the Shotgun method returns
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+
+            try:
+                if self.hedge_after and name in self.read_methods:
+                    return self._hedged(name, args, kwargs)
+
+                return getattr(self._client, name)(*args, **kwargs)
+
+            except Exception as e:
+                if attempt >= self.max_retries or not self._retryable(name, e):
+                    raise
+
+                # back off with some jitter so throttled threads don't all come back at once
+                delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+                delay = random.uniform(delay / 2, delay)
+                print(f'Shotgrid {name} throttled ({e}). Retrying in {delay:.2f}s')
+
+                with self._cond:
+                    self.retries += 1
+
+                time.sleep(delay)
+                self._local.wait = self.thread_wait() + delay
+                attempt += 1
+
+    def _hedged(self, name, args, kwargs):
+        """
+        Runs a read and if it is slow sends a second copy on another connection, using whichever
+        answers first
+
+        :param name: (str) Shotgun method name
+        :return: whatever the Shotgun method returns
+        """
+        with self._cond:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(thread_name_prefix='ShotgridHedge')
+            executor = self._hedge_executor
+
+        method = getattr(self._client, name)
+        futures = [executor.submit(method, *args, **kwargs)]
+
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            self._acquire()
+            with self._cond:
+                self.hedges += 1
+            futures.append(executor.submit(method, *args, **kwargs))
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+        # prefer a successful result if we have one
+        for future in done:
+            if not future.exception():
+                return future.result()
+
+        return done.pop().result()
+
+
+sg_scheduler = RequestScheduler(sg_pool)
+
+
+def batch_lane():
+    """
+    Runs any Shotgrid calls on this thread inside the with block in the low priority batch lane
+
+        with batch_lane():
+            update_pipeline_step(...)
+    """
+    return sg_scheduler.lane('batch')
+
+
+def _batch_job(func):
+    """
+    Decorator that runs a function's Shotgrid calls in the batch lane
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with batch_lane():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+# ##------------------------------------------------## #
+# Instrumentation
+# ##------------------------------------------------## #
+class InstrumentedShotgun:
+    """
+    Wraps a Shotgun connection and records how long each call takes, how much data comes back and which
+    wrapper function and caller made it. When the connection is a RequestScheduler the time spent queued
+    for budget or backing off is recorded as queue_ms and kept out of the latency. Anything we don't
+    instrument is passed straight through to the connection.
+    """
+    # upper bounds of the latency histogram buckets in milliseconds
+    buckets = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+    # Shotgun methods we record
+    methods = ('find', 'find_one', 'summarize', 'create', 'update', 'delete', 'revive', 'batch',
+               'upload', 'download_attachment')
+
+    def __init__(self, client, log_path=None, measure_payload=True):
+        """
+        :param client: (Shotgun) Shotgrid connection to wrap
+        :param log_path: (str) Optional path to a json lines file that every call is written to
+        :param measure_payload: (bool) If True records the size of each result in bytes
+        """
+        self._client = client
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._log = None
+
+        # only the scheduler knows how long a call sat in its queue
+        self._thread_wait = getattr(client, 'thread_wait', None)
+
+        self.measure_payload = measure_payload
+        self.reset()
+
+        if log_path:
+            self.set_log(log_path)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+
+        if name not in self.methods or not callable(attr):
+            return attr
+
+        def instrumented(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+
+        return instrumented
+
+    def reset(self):
+        """
+        Clears all the recorded data
+        """
+        with self._lock:
+            self._methods = {}
+            self._entities = {}
+            self._call_sites = {}
+
+    def set_log(self, log_path):
+        """
+        Starts writing every call out to a json lines file. Pass None to stop
+
+        :param log_path: (str) Path to the log file
+        """
+        with self._lock:
+            if self._log:
+                self._log.close()
+
+            self._log = open(log_path, 'a', buffering=1) if log_path else None
+
+    def snapshot(self):
+        """
+        Returns everything we have recorded so far
+
+        :return: (dict) Stats by method, by (method, entity type) and by call site
+        """
+        with self._lock:
+            return dict(methods=copy.deepcopy(self._methods),
+                        entities={f'{k[0]}:{k[1]}': copy.deepcopy(v) for k, v in self._entities.items()},
+                        call_sites=copy.deepcopy(self._call_sites))
+
+    def thread_calls(self):
+        """
+        Gets the number of calls the current thread has sent to Shotgrid. Take the difference before and
+        after some work to see how many round trips it really made, cache hits aren't counted
+
+        :return: (int) Number of calls made from this thread so far
+        """
+        return getattr(self._local, 'calls', 0)
+
+    def thread_bytes(self):
+        """
+        Gets the size of all the results the current thread has pulled from Shotgrid. Only counts anything
+        while measure_payload is on
+
+        :return: (int) Bytes received on this thread so far
+        """
+        return getattr(self._local, 'bytes', 0)
+
+    def _call(self, name, method, args, kwargs):
+        """
+        Runs a Shotgun method and records it
+
+        :param name: (str) Name of the Shotgun method
+        :param method: (function) Bound Shotgun method
+        :return: Whatever the Shotgun method returns
+        """
+        wrapper, caller = self._call_site()
+        entity = args[0] if args and isinstance(args[0], str) else None
+
+        self._local.calls = self.thread_calls() + 1
+
+        error = None
+        result = None
+        wait_before = self._thread_wait() if self._thread_wait else 0.0
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+
+            # split the time spent waiting in the scheduler out from the time spent on the wire
+            queue_ms = 0.0
+            if self._thread_wait:
+                queue_ms = min(ms, (self._thread_wait() - wait_before) * 1000)
+                ms -= queue_ms
+
+            if isinstance(result, list):
+                rows = len(result)
+            else:
+                rows = 0 if result is None else 1
+
+            size = 0
+            if self.measure_payload and name != 'download_attachment':
+                size = len(json.dumps(result, default=str))
+                self._local.bytes = self.thread_bytes() + size
+
+            self._record(name, entity, f'{wrapper} <- {caller}', ms, queue_ms, rows, size, error)
+
+    def _record(self, name, entity, call_site, ms, queue_ms, rows, size, error):
+        """
+        Adds a call to our stats and log
+        """
+        bucket = next(i for i in self.buckets if ms <= i)
+        bucket = 'inf' if bucket == float('inf') else str(bucket)
+
+        with self._lock:
+            for stats_dict, key in ((self._methods, name),
+                                    (self._entities, (name, entity)),
+                                    (self._call_sites, call_site)):
+                stats = stats_dict.get(key)
+                if not stats:
+                    stats = stats_dict[key] = dict(calls=0, errors=0, total_ms=0.0, max_ms=0.0, queue_ms=0.0,
+                                                   rows=0, bytes=0, histogram={})
+                stats['calls'] += 1
+                stats['errors'] += 1 if error else 0
+                stats['total_ms'] += ms
+                stats['queue_ms'] += queue_ms
+                stats['max_ms'] = max(stats['max_ms'], ms)
+                stats['rows'] += rows
+                stats['bytes'] += size
+                stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+
+            if self._log:
+                self._log.write(json.dumps(dict(time=time.time(), method=name, entity=entity, ms=round(ms, 3),
+                                                queue_ms=round(queue_ms, 3), rows=rows, bytes=size,
+                                                call_site=call_site, error=error)) + '\n')
+
+    @staticmethod
+    def _call_site():
+        """
+        Works out which wrapper function in this module made the call and what called that
+
+        :return: (tuple) (wrapper, caller) names
+        """
+        def frame_name(frame):
+            name = frame.f_code.co_name
+            owner = frame.f_locals.get('self')
+            if owner is not None:
+                name = f'{type(owner).__name__}.{name}'
+            return name
+
+        def is_nested(frame):
+            # closures like the fetch in _find aren't module functions or methods so they are skipped
+            code = frame.f_code
+            func = module_globals.get(code.co_name)
+            if getattr(getattr(func, '__wrapped__', func), '__code__', None) is code:
+                return False
+
+            owner = frame.f_locals.get('self')
+            method = getattr(type(owner), code.co_name, None) if owner is not None else None
+            return getattr(getattr(method, 'fget', method), '__code__', None) is not code
+
+        # skip over the instrumentation frames
+        frame = sys._getframe(3)
+        module_globals = globals()
+
+        innermost = frame_name(frame)
+        wrapper = None
+        while frame and frame.f_globals is module_globals:
+            # use the outermost public function, which is the one that was called from outside the module
+            if not is_nested(frame) and not frame.f_code.co_name.startswith('_'):
+                wrapper = frame_name(frame)
+            frame = frame.f_back
+
+        wrapper = wrapper or innermost
+
+        caller = frame_name(frame) if frame else None
+
+        return wrapper, caller
+
+
+sg = InstrumentedShotgun(sg_scheduler)
+
+
+def get_call_stats():
+    """
+    Returns the recorded Shotgrid call stats
+
+    :return: (dict) Stats by method, by (method, entity type) and by call site
+    """
+    return sg.snapshot()
+
+
+def set_call_log(log_path):
+    """
+    Writes every Shotgrid call out to a json lines file
+
+    :param log_path: (str) Path to the log file. None to stop logging
+    """
+    sg.set_log(log_path)
+
+
+# ##------------------------------------------------## #
+# Field Functions
+# ##------------------------------------------------## #
+def register_field_preset(entity, preset, fields):
+    """
+    Adds or replaces a named field preset for an entity type
+
+    :param entity: (str) Entity type the preset is for
+    :param preset: (str) Name of the preset
+    :param fields: (list) Fields the preset returns
+    :return: None
+    """
+    if preset == 'default':
+        print(f'Cannot replace the default preset for {entity}. Update entity_fields instead')
+        return
+
+    presets = field_presets.setdefault(entity, {})
+    presets[preset] = tuple(fields)
+
+
+def get_fields(entity, preset='default', additional_fields=None):
+    """
+    Builds the list of fields to query for an entity from a preset and any additional fields. Always
+    returns a new list so the presets are never changed. Linked field paths such as
+    'sg_parent.Asset.sg_ue_skeletonpath' also pull the link field they hang off so they can be nested
+
+    :param entity: (str) Entity type we want fields for
+    :param preset: (str) Name of the field preset to start from
+    :param additional_fields: (list) Additional fields to add on top of the preset
+    :return: (list) Fields to query
+    """
+    if preset == 'default':
+        fields = list(entity_fields[entity])
+    else:
+        fields = list(field_presets[entity][preset])
+
+    for field in additional_fields or []:
+        for i in [field.split('.')[0], field]:
+            if i not in fields:
+                fields.append(i)
+
+    return fields
+
+
+def _nest_linked_fields(record):
+    """
+    Moves linked field values Shotgrid returns as flat dotted keys onto the linked entity they belong to,
+    e.g. 'sg_parent.Asset.code' becomes record['sg_parent']['code']. Values for links that are empty are
+    dropped. Returns a new dict and leaves the one passed in alone
+
+    :param record: (dict) Shotgrid entity data
+    :return: (dict) Entity data with the linked fields nested
+    """
+    if not record:
+        return record
+
+    # shorter paths first so a link is in place before any fields further down it
+    paths = sorted((key for key in record if '.' in key), key=lambda key: key.count('.'))
+    if not paths:
+        return record
+
+    record = dict(record)
+
+    for path in paths:
+        value = record.pop(path)
+        parts = path.split('.')
+        target = record
+
+        # parts alternate link field and entity type, ending on the field we want
+        for field, entity in zip(parts[:-1:2], parts[1::2]):
+            if field not in target:
+                target[field] = {'type': entity}
+
+            if not isinstance(target[field], dict):
+                break
+
+            target[field] = dict(target[field])
+            target = target[field]
+        else:
+            target[parts[-1]] = value
+
+    return record
+
+
+def _record_preset_stats(entity, preset, result, usage_before):
+    """
+    Adds a query result to the running totals for a preset. The size comes from what the instrumented
+    connection measured, so results served from the cache add to the rows but not the bytes
+
+    :param entity: (str) Entity type that was queried
+    :param preset: (str) Name of the preset that was used
+    :param result: (dict|list) Query result
+    :param usage_before: (tuple) sg.thread_calls() and sg.thread_bytes() from before the query was run
+    :return: None
+    """
+    if result is None:
+        rows = 0
+    elif isinstance(result, dict):
+        rows = 1
+    else:
+        rows = len(result)
+
+    calls_before, bytes_before = usage_before
+
+    stats = preset_stats.setdefault((entity, preset), dict(calls=0, rows=0, fetched_rows=0, bytes=0))
+    stats['calls'] += 1
+    stats['rows'] += rows
+
+    if sg.thread_calls() > calls_before:
+        stats['fetched_rows'] += rows
+        stats['bytes'] += sg.thread_bytes() - bytes_before
+
+
+def get_preset_stats():
+    """
+    Gets a report of how much data each field preset has returned
+
+    :return: (dict) Calls, rows, bytes and average bytes per row keyed by (entity, preset)
+    """
+    report = {}
+    for key, stats in preset_stats.items():
+        fetched = stats['fetched_rows']
+        report[key] = dict(stats, bytes_per_row=stats['bytes'] / fetched if fetched else 0)
+
+    return report
+
+
+# ##------------------------------------------------## #
+# Cache Functions
+# ##------------------------------------------------## #
+class QueryCache:
+    """
+    Size bounded LRU cache for Shotgrid query results. Results expire after the ttl set for their entity
+    type and are dropped when a write goes through the wrapper for that entity type.
+    """
+    def __init__(self, max_size=2048, default_ttl=60, ttls=None):
+        """
+        :param max_size: (int) Max number of queries to hold before the least recently used are evicted
+        :param default_ttl: (int) Seconds to hold a result for entity types that aren't in ttls
+        :param ttls: (dict) Seconds to hold results for, keyed by entity type
+        """
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.ttls = cache_ttls if ttls is None else ttls
+        self.enabled = True
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(method, entity, filters, fields, **kwargs):
+        """
+        Builds a canonical key for a query so the same query always maps to the same key no matter the
+        order the filters and fields were given in
+
+        :param method: (str) Name of the Shotgrid method, eg find or find_one
+        :param entity: (str) Entity type being queried
+        :param filters: (list) Shotgrid filters
+        :param fields: (list) Fields being returned
+        :return: (tuple) Cache key
+        """
+        filter_keys = sorted(json.dumps(i, sort_keys=True, default=str) for i in filters)
+        field_keys = tuple(sorted(fields or []))
+        kwarg_keys = json.dumps(kwargs, sort_keys=True, default=str)
+
+        return method, entity, tuple(filter_keys), field_keys, kwarg_keys
+
+    def get(self, key):
+        """
+        Gets a cached result
+
+        :param key: (tuple) Cache key from make_key
+        :return: (tuple) (found, result). The result is a copy so callers can change it freely
+        """
+        with self._lock:
+            if not self.enabled or key not in self._data:
+                self.misses += 1
+                return False, None
+
+            expires, result = self._data[key]
+            if expires < time.time():
+                del self._data[key]
+                self.misses += 1
+                return False, None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+
+            return True, copy.deepcopy(result)
+
+    def put(self, key, result, ttl=None):
+        """
+        Adds a result to the cache, evicting the least recently used results if we are full
+
+        :param key: (tuple) Cache key from make_key
+        :param result: (dict|list) Query result
+        :param ttl: (int) Seconds to hold the result for. Defaults to the ttl for the entity type
+        :return: None
+        """
+        if not self.enabled:
+            return
+
+        entity = key[1]
+        if ttl is None:
+            ttl = self.ttls.get(entity, self.default_ttl)
+
+        with self._lock:
+            self._data[key] = (time.time() + ttl, copy.deepcopy(result))
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, entity=None):
+        """
+        Drops cached results for an entity type
+
+        :param entity: (str) Entity type to drop. If None everything is dropped
+        :return: (int) Number of results dropped
+        """
+        with self._lock:
+            if entity is None:
+                keys = list(self._data.keys())
+            else:
+                keys = [key for key in self._data if key[1] == entity]
+
+            for key in keys:
+                del self._data[key]
+
+            self.invalidations += len(keys)
+
+        return len(keys)
+
+    def invalidate_records(self, changes):
+        """
+        Drops only the cached results a set of record changes could affect. That is any result holding or
+        linking to a changed record, any query filtering on a link to one, and any query of the same entity
+        type that filters on a field that changed. If we don't know which fields changed (new or retired
+        records) every query of that entity type is dropped
+
+        :param changes: (dict) Changed fields keyed by (entity, id). None if the whole record changed
+        :return: (int) Number of results dropped
+        """
+        records = set(changes)
+
+        changed_fields = {}
+        for (entity, sg_id), fields in changes.items():
+            if fields is None or changed_fields.get(entity, set()) is None:
+                changed_fields[entity] = None
+            else:
+                changed_fields.setdefault(entity, set()).update(fields)
+
+        def references(data):
+            # walk the data looking for an entity dict for one of the changed records
+            if isinstance(data, dict):
+                if (data.get('type'), data.get('id')) in records:
+                    return True
+                return any(references(i) for i in data.values())
+            if isinstance(data, (list, tuple)):
+                return any(references(i) for i in data)
+            return False
+
+        def filter_fields(data):
+            # the fields used in a filter, walking into nested filter groups
+            if isinstance(data, dict):
+                return {field for i in data.get('filters', []) for field in filter_fields(i)}
+            if isinstance(data, list) and data and isinstance(data[0], str):
+                return {data[0].split('.')[0]}
+            return set()
+
+        with self._lock:
+            keys = []
+
+            for key, (expires, result) in self._data.items():
+                method, entity, filter_keys = key[:3]
+                filters = [json.loads(i) for i in filter_keys]
+
+                if entity in changed_fields:
+                    fields = changed_fields[entity]
+                    used = {field for i in filters for field in filter_fields(i)}
+
+                    if method == 'summarize' or fields is None or used & fields:
+                        keys.append(key)
+                        continue
+
+                if references(result) or references(filters):
+                    keys.append(key)
+
+            for key in keys:
+                del self._data[key]
+
+            self.invalidations += len(keys)
+
+        return len(keys)
+
+    def stats(self):
+        """
+        Returns the hit/miss statistics for the cache
+
+        :return: (dict) Cache statistics
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return dict(size=len(self._data),
+                        max_size=self.max_size,
+                        hits=self.hits,
+                        misses=self.misses,
+                        hit_rate=self.hits / total if total else 0.0,
+                        evictions=self.evictions,
+                        invalidations=self.invalidations)
+
+
+query_cache = QueryCache()
+
+
+class SingleFlight:
+    """
+    Makes sure identical queries that are running at the same time only go to Shotgrid once. The first
+    caller runs the query and anyone else asking for the same thing waits for that result.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """
+        Runs func unless a call with the same key is already running, in which case we wait for it
+
+        :param key: (tuple) Canonical key for the query
+        :param func: (function) Runs the query
+        :return: Result of the query. Callers that waited get their own copy
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = dict(event=threading.Event(), result=None, error=None, waiters=0)
+                self.calls += 1
+            else:
+                call['waiters'] += 1
+                self.coalesced += 1
+
+        if not leader:
+            call['event'].wait()
+            if call['error']:
+                raise call['error']
+            return copy.deepcopy(call['result'])
+
+        result = None
+        try:
+            result = func()
+            return result
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            # once the call is out of the table nobody else can join, so we know if anyone is waiting
+            with self._lock:
+                del self._calls[key]
+                waiters = call['waiters']
+
+            # the waiters copy from their own snapshot so the leader's caller is free to change the result
+            if waiters and not call['error']:
+                call['result'] = copy.deepcopy(result)
+            call['event'].set()
+
+    def stats(self):
+        """
+        :return: (dict) Number of queries run, coalesced into another call and currently running
+        """
+        with self._lock:
+            return dict(calls=self.calls, coalesced=self.coalesced, in_flight=len(self._calls))
+
+
+inflight = SingleFlight()
+
+
+def _find(entity, filters, fields, use_cache=True, **kwargs):
+    """
+    Runs sg.find through the query cache. Identical queries running at the same time are only sent once
+
+    :param entity: (str) Entity type to query
+    :param filters: (list) Shotgrid filters
+    :param fields: (list) Fields to return
+    :param use_cache: (bool) If False will always go to Shotgrid
+    :return: (list) Shotgrid query data
+    """
+    key = QueryCache.make_key('find', entity, filters, fields, **kwargs)
+
+    if use_cache:
+        found, result = query_cache.get(key)
+        if found:
+            return result
+
+    def fetch():
+        result = sg.find(entity, filters, fields, **kwargs)
+        query_cache.put(key, result)
+        return result
+
+    # if someone else is already running this exact query wait for their result
+    if use_cache:
+        return inflight.do(key, fetch)
+
+    return fetch()
+
+
+def _find_one(entity, filters, fields, use_cache=True, **kwargs):
+    """
+    Runs sg.find_one through the query cache. Identical queries running at the same time are only sent once
+
+    :param entity: (str) Entity type to query
+    :param filters: (list) Shotgrid filters
+    :param fields: (list) Fields to return
+    :param use_cache: (bool) If False will always go to Shotgrid
+    :return: (dict) Shotgrid query data
+    """
+    key = QueryCache.make_key('find_one', entity, filters, fields, **kwargs)
+
+    if use_cache:
+        found, result = query_cache.get(key)
+        if found:
+            return result
+
+    def fetch():
+        result = sg.find_one(entity, filters, fields, **kwargs)
+        query_cache.put(key, result)
+        return result
+
+    # if someone else is already running this exact query wait for their result
+    if use_cache:
+        return inflight.do(key, fetch)
+
+    return fetch()
+
+
+# ##------------------------------------------------## #
+# Snapshot Functions
+# ##------------------------------------------------## #
+class SnapshotStore:
+    """
+    Local SQLite copy of project data from Shotgrid. Records are indexed by id and code so editor lookups
+    can be answered from disk. Syncing only pulls records that have changed since the last sync.
+    """
+    # entity types held in the snapshot
+    entities = ('Shot', 'Scene', 'Asset', 'Version', 'Playlist', 'Episode')
+
+    # filter operators we can answer locally
+    operators = ('is', 'is_not', 'in', 'not_in')
+
+    def __init__(self, path, max_staleness=300, overlap=5):
+        """
+        :param path: (str) Path to the SQLite database file
+        :param max_staleness: (int) Max number of seconds since the last sync before we stop answering
+                              queries from the snapshot
+        :param overlap: (int) Seconds before the watermark each sync starts from. updated_at only goes down
+                        to the second, so records changed in the same second as the last sync would
+                        otherwise be missed
+        """
+        self.path = path
+        self.max_staleness = max_staleness
+        self.overlap = overlap
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS records ('
+                               'entity TEXT, id INTEGER, project TEXT, code TEXT, updated_at TEXT, data TEXT, '
+                               'PRIMARY KEY (entity, id))')
+            # shotgrid string filters ignore case so the code index has to as well
+            self._conn.execute('DROP INDEX IF EXISTS records_code')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS records_code_nocase '
+                               'ON records (entity, project, code COLLATE NOCASE)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS sync_state ('
+                               'entity TEXT, project TEXT, watermark TEXT, synced_at REAL, fields TEXT, '
+                               'PRIMARY KEY (entity, project))')
+
+    @staticmethod
+    def fields(entity):
+        """
+        Gets the fields we hold in the snapshot for an entity type
+
+        :param entity: (str) Entity type
+        :return: (list) Fields held in the snapshot
+        """
+        return get_fields(entity, additional_fields=list(snapshot_fields.get(entity, ())) + ['updated_at'])
+
+    def sync(self, prj, entities=None, full=False):
+        """
+        Pulls any records that have changed since the last sync into the snapshot
+
+        :param prj: (str) Project code
+        :param entities: (list) Entity types to sync. Defaults to all the snapshot entity types
+        :param full: (bool) If True will drop what we have and pull everything again. Use this to pick up
+                     records that have been deleted in Shotgrid
+        :return: (dict) Number of records pulled for each entity type
+        """
+        synced = {}
+
+        for entity in entities or self.entities:
+            fields = self.fields(entity)
+            filters = [bron_paths.project_filters[prj]]
+
+            state = self._state(prj, entity)
+
+            # if the fields have changed since the last sync we need everything again
+            if full or not state or state['fields'] != fields:
+                with self._lock, self._conn:
+                    self._conn.execute('DELETE FROM records WHERE entity = ? AND project = ?', (entity, prj))
+                watermark = None
+            else:
+                watermark = state['watermark']
+
+            # re-pulling the records in the overlap is harmless as they just replace what we have
+            if watermark:
+                since = datetime.fromisoformat(watermark) - timedelta(seconds=self.overlap)
+                filters.append(['updated_at', 'greater_than', since])
+
+            synced_at = time.time()
+            records = sg.find(entity, filters, fields)
+
+            rows = []
+            for record in records:
+                updated_at = record.get('updated_at')
+                updated_at = updated_at.isoformat() if updated_at else None
+
+                if updated_at and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+
+                rows.append((entity, record['id'], prj, record.get('code'), updated_at,
+                             json.dumps(record, default=str)))
+
+            with self._lock, self._conn:
+                self._conn.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self._conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)',
+                                   (entity, prj, watermark, synced_at, json.dumps(fields)))
+
+            synced[entity] = len(rows)
+
+        print(f'Synced snapshot for {prj}: {synced}')
+
+        return synced
+
+    def find(self, prj, entity, filters, fields):
+        """
+        Attempts to answer a query from the snapshot
+
+        :param prj: (str) Project code
+        :param entity: (str) Entity type to query
+        :param filters: (list) Shotgrid filters
+        :param fields: (list) Fields to return
+        :return: (tuple) (found, records). found is False if the snapshot can't answer this query
+        """
+        state = self._state(prj, entity)
+        if not state or time.time() - state['synced_at'] > self.max_staleness:
+            return False, None
+
+        # make sure we hold every field we have been asked for or need to filter on
+        held = set(state['fields']) | {'id', 'type'}
+        filters = [i for i in filters if i != bron_paths.project_filters[prj]]
+
+        if not set(fields or []) <= held:
+            return False, None
+
+        for flt in filters:
+            if not isinstance(flt, (list, tuple)) or len(flt) != 3:
+                return False, None
+            if flt[0] not in held or flt[1] not in self.operators:
+                return False, None
+
+        # use our indexes where we can before checking the rest of the filters
+        query = 'SELECT data FROM records WHERE entity = ? AND project = ?'
+        args = [entity, prj]
+
+        for field, operator, value in filters:
+            if field == 'id' and operator == 'is':
+                query += ' AND id = ?'
+                args.append(value)
+
+            # NOCASE only folds ascii, anything else is left for _match to check
+            elif field == 'code' and operator == 'is' and isinstance(value, str) and value.isascii():
+                query += ' AND code = ? COLLATE NOCASE'
+                args.append(value)
+
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+
+        records = []
+        for row in rows:
+            record = json.loads(row[0])
+            if all(self._match(record, flt) for flt in filters):
+                data = {'type': entity, 'id': record['id']}
+                data.update({i: record.get(i) for i in fields or []})
+                records.append(data)
+
+        return True, records
+
+    def expire(self, entity):
+        """
+        Marks an entity type as out of date so queries go back to Shotgrid until the next sync
+
+        :param entity: (str) Entity type to expire
+        :return: None
+        """
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE sync_state SET synced_at = 0 WHERE entity = ?', (entity,))
+
+    def _state(self, prj, entity):
+        """
+        Gets the sync state for an entity type
+
+        :param prj: (str) Project code
+        :param entity: (str) Entity type
+        :return: (dict) Watermark, sync time and fields for the entity type. None if never synced
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT watermark, synced_at, fields FROM sync_state '
+                                     'WHERE entity = ? AND project = ?', (entity, prj)).fetchone()
+        if not row:
+            return None
+
+        return dict(watermark=row[0], synced_at=row[1], fields=json.loads(row[2]))
+
+    @staticmethod
+    def _match(record, flt):
+        """
+        Checks a record against a single filter. Strings are compared ignoring case like Shotgrid does
+
+        :param record: (dict) Record data
+        :param flt: (list) Shotgrid filter
+        :return: (bool) True if the record passes the filter
+        """
+        field, operator, value = flt
+
+        def normalize(item):
+            # entity links are compared on type and id
+            if isinstance(item, dict):
+                return item.get('type'), item.get('id')
+            if isinstance(item, str):
+                return item.lower()
+            return item
+
+        record_value = record.get(field)
+        if isinstance(record_value, list):
+            record_values = [normalize(i) for i in record_value]
+        else:
+            record_values = [normalize(record_value)]
+
+        if operator in ('in', 'not_in'):
+            values = [normalize(i) for i in value]
+        else:
+            values = [normalize(value)]
+
+        matched = any(i in values for i in record_values)
+
+        return matched if operator in ('is', 'in') else not matched
+
+
+snapshot_store = None
+
+
+def enable_snapshot(path, max_staleness=300):
+    """
+    Turns on answering queries from a local snapshot
+
+    :param path: (str) Path to the SQLite database file
+    :param max_staleness: (int) Max number of seconds since the last sync before we go back to Shotgrid
+    :return: (SnapshotStore) the snapshot store
+    """
+    global snapshot_store
+    snapshot_store = SnapshotStore(path, max_staleness=max_staleness)
+
+    return snapshot_store
+
+
+def disable_snapshot():
+    """
+    Turns off answering queries from the local snapshot
+    """
+    global snapshot_store
+    snapshot_store = None
+
+
+def sync_snapshot(prj, entities=None, full=False):
+    """
+    Syncs the local snapshot with any changes in Shotgrid
+
+    :param prj: (str) Project code
+    :param entities: (list) Entity types to sync. Defaults to all the snapshot entity types
+    :param full: (bool) If True will pull everything again
+    :return: (dict) Number of records pulled for each entity type
+    """
+    if not snapshot_store:
+        print('Snapshot is not enabled. Call enable_snapshot first')
+        return None
+
+    return snapshot_store.sync(prj, entities=entities, full=full)
+
+
+# ##------------------------------------------------## #
+# Reference Data
+# ##------------------------------------------------## #
+class ReferenceIndex:
+    """
+    In-memory index of the Steps, HumanUsers and Projects. These barely change during a session, so they
+    are pulled in one query each the first time they are needed and looked up from dicts after that.
+    Call refresh to pick up new records, or let a miss reload them once the data is older than max_age
+    """
+    fields = {'Step': ['code', 'short_name', 'entity_type', 'department'],
+              'HumanUser': ['login', 'name'],
+              'Project': ['name']}
+
+    def __init__(self, max_age=3600):
+        """
+        :param max_age: (int) Seconds before a lookup that misses will reload the index
+        """
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._steps = {}
+        self._users = {}
+        self._projects = {}
+        self._stats = dict(loads=0, hits=0, misses=0)
+
+    def load(self, force=False):
+        """
+        Pulls the reference data from Shotgrid if it hasn't been loaded yet
+
+        :param force: (bool) If True will reload even if we already have the data
+        :return: None
+        """
+        with self._lock:
+            if self._loaded_at and not force:
+                return
+
+            # shotgrid matches codes and logins without caring about case so key them lower cased to do the same
+            steps = {}
+            for step in sg.find('Step', [], self.fields['Step']):
+                for field in ('short_name', 'code'):
+                    if step.get(field):
+                        steps.setdefault((step['entity_type'], field, str(step[field]).lower()), []).append(step)
+
+            self._steps = steps
+            self._users = {str(user['login']).lower(): user
+                           for user in sg.find('HumanUser', [], self.fields['HumanUser']) if user.get('login')}
+            self._projects = {project['name']: project
+                              for project in sg.find('Project', [], self.fields['Project'])}
+
+            self._loaded_at = time.time()
+            self._stats['loads'] += 1
+
+    def refresh(self):
+        """
+        Reloads all the reference data
+
+        :return: None
+        """
+        self.load(force=True)
+
+    def steps(self, entity_type, short_name=None, code=None):
+        """
+        Finds the pipeline steps for an entity type
+
+        :param entity_type: (str) Entity type the step belongs to
+        :param short_name: (str) Short name of the step
+        :param code: (str) Code of the step
+        :return: (list) Matching steps
+        """
+        def lookup():
+            if short_name:
+                found = self._steps.get((entity_type, 'short_name', str(short_name).lower()), [])
+                return [step for step in found if not code or str(step['code']).lower() == str(code).lower()]
+            if code:
+                return self._steps.get((entity_type, 'code', str(code).lower()), [])
+            return [step for key, found in self._steps.items() if key[:2] == (entity_type, 'code')
+                    for step in found]
+
+        return copy.deepcopy(self._lookup(lookup, many=True))
+
+    def user(self, login):
+        """
+        :param login: (str) Login of the user
+        :return: (dict) HumanUser or None
+        """
+        return copy.deepcopy(self._lookup(lambda: self._users.get(str(login).lower())))
+
+    def project(self, name):
+        """
+        Finds a project by its name. If there is no exact match the first project whose name contains it
+        is returned
+
+        :param name: (str) Project name
+        :return: (dict) Project or None
+        """
+        def lookup():
+            if name in self._projects:
+                return self._projects[name]
+            return next((project for key, project in self._projects.items() if name in key), None)
+
+        return copy.deepcopy(self._lookup(lookup))
+
+    def stats(self):
+        """
+        :return: (dict) Number of loads, hits and misses and the size of each index
+        """
+        return dict(self._stats,
+                    steps=sum(len(found) for key, found in self._steps.items() if key[1] == 'code'),
+                    users=len(self._users),
+                    projects=len(self._projects))
+
+    def _lookup(self, func, many=False):
+        """
+        Runs a lookup, reloading the index and trying again if it misses and the data is stale
+
+        :param func: (function) Returns the match or None/empty list
+        :param many: (bool) If the lookup returns a list
+        :return: Result of func
+        """
+        self.load()
+        result = func()
+
+        if not result and time.time() - self._loaded_at > self.max_age:
+            self.refresh()
+            result = func()
+
+        self._stats['hits' if result else 'misses'] += 1
+
+        return result if result or not many else []
+
+
+reference_index = ReferenceIndex(max_age=cache_ttls['Step'])
+
+
+def refresh_reference_data():
+    """
+    Reloads the Step, HumanUser and Project index from Shotgrid
+
+    :return: (dict) Index stats
+    """
+    reference_index.refresh()
+
+    return reference_index.stats()
 
 
 # ##------------------------------------------------## #
@@ -29,18 +1588,9 @@ def get_pipeline_step(entity_type, shortcode=None, code=None):
     :return: (PipelineStep) Shotgrid pipeline step data
     """
 
-    # Given a short code and entity type will return a pipeline step if it exists
-    step_filter = [['entity_type', 'is', entity_type]]
-
-    # add data depending on what is passed in
-    if shortcode:
-        step_filter.append(['short_name', 'is', shortcode])
-    if code:
-        step_filter.append(['code', 'is', code])
-
-    step_fields = ['department', 'short_name']
-
-    steps = sg.find('Step', step_filter, step_fields)
+    # Given a short code and entity type will return a pipeline step if it exists. Steps are looked up
+    # from the reference index rather than queried each time
+    steps = reference_index.steps(entity_type, short_name=shortcode, code=code)
 
     if len(steps) > 1:
         print('Found multiple steps for {}'.format(shortcode))
@@ -61,31 +1611,77 @@ def get_latest_version(entity, step):
     :return: (int) next version number
     """
 
-    # gets the next version number for a step on an entity
+    # gets the next version number for a step on an entity. Let Shotgrid sort the versions and only
+    # send back the highest one
     version_filters = [['entity', 'is', entity],
-                       ['sg_pipeline_step', 'is', step]]
+                       ['sg_pipeline_step', 'is', step],
+                       ['sg_version_number', 'is_not', None]]
     version_fields = ['sg_version_number']
+    version_order = [{'field_name': 'sg_version_number', 'direction': 'desc'}]
 
-    all_versions = sg.find('Version', version_filters, version_fields)
-    version_num = 0
+    latest = sg.find_one('Version', version_filters, version_fields, order=version_order)
 
-    for i in all_versions:
-        sg_version_num = i.get('sg_version_number')
-        if not sg_version_num:
-            continue
-        if int(sg_version_num) > version_num: version_num = int(sg_version_num)
+    if not latest:
+        return 1
 
-    return version_num + 1
+    return int(latest['sg_version_number']) + 1
 
 
-def get_entity(prj, entity, name=None, sg_id=None, additional_fields=None, additional_filters=None):
+def get_next_versions(entity_steps):
+    """
+    Gets the next version number for many entity and pipeline step pairs at once. Useful when publishing
+    across a whole scene
+
+    :param entity_steps: (list) List of (entity, step) tuples where both are Shotgrid entity dicts
+    :return: (dict) Next version number keyed by (entity type, entity id, step id)
+    """
+    # we walk the pairs twice so a generator passed in would be empty by the time we query
+    entity_steps = list(entity_steps)
+
+    next_versions = {}
+    for entity, step in entity_steps:
+        next_versions[(entity['type'], entity['id'], step['id'])] = 1
+
+    summary_fields = [{'field': 'sg_version_number', 'type': 'maximum'}]
+    grouping = [{'field': 'entity', 'type': 'exact', 'direction': 'asc'},
+                {'field': 'sg_pipeline_step', 'type': 'exact', 'direction': 'asc'}]
+
+    for chunk in _chunks(entity_steps, id_chunk_size):
+        entities = list({(i['type'], i['id']): i for i, _ in chunk}.values())
+        steps = list({i['id']: i for _, i in chunk}.values())
+
+        version_filters = [['entity', 'in', entities],
+                           ['sg_pipeline_step', 'in', steps]]
+
+        summary = sg.summarize('Version', version_filters, summary_fields, grouping=grouping)
+
+        # go through our groups and pull out the max version for each pair we asked for
+        for entity_group in summary['groups']:
+            entity = entity_group['group_value']
+
+            for step_group in entity_group['groups']:
+                step = step_group['group_value']
+                key = (entity['type'], entity['id'], step['id'])
+
+                version_num = step_group['summaries']['sg_version_number']
+                if key in next_versions and version_num:
+                    next_versions[key] = int(version_num) + 1
+
+    return next_versions
+
+
+def get_entity(prj, entity, name=None, sg_id=None, additional_fields=None, additional_filters=None,
+               preset='default', use_cache=True):
     """
     Gets playlist data given a name or an id
 
     : project: (str) project code
     : name: (str) name of a playlist to return
     : id (int) id for a playlist
-    : additional_fields: (list) additional fields the user wants information back
+    : additional_fields: (list) additional fields the user wants information back. Linked field paths like
+                         'sg_parent.Asset.code' come back nested under the link field
+    : preset: (str) name of the field preset to query
+    : use_cache: (bool) if False will skip the query cache and snapshot and always go to Shotgrid
 
     :return: (dict) Shotgrid query data for an entity
     """
@@ -100,10 +1696,7 @@ def get_entity(prj, entity, name=None, sg_id=None, additional_fields=None, addit
         return None
 
     # get our fields based on the entity passed in
-    sg_fields = entity_fields[entity]
-
-    sg_fields.extend(additional_fields)
-    sg_fields = list(set(sg_fields))
+    sg_fields = get_fields(entity, preset, additional_fields)
 
     # add our project filter
     sg_filters = [bron_paths.project_filters[prj]]
@@ -116,17 +1709,30 @@ def get_entity(prj, entity, name=None, sg_id=None, additional_fields=None, addit
 
     sg_filters.extend(additional_filters)
 
-    return sg.find_one(entity, sg_filters, sg_fields)
+    # see if we can answer this from our local snapshot first
+    if use_cache and snapshot_store:
+        found, records = snapshot_store.find(prj, entity, sg_filters, sg_fields)
+        if found:
+            return records[0] if records else None
+
+    usage_before = sg.thread_calls(), sg.thread_bytes()
+    result = _find_one(entity, sg_filters, sg_fields, use_cache=use_cache)
+    _record_preset_stats(entity, preset, result, usage_before)
+
+    return _nest_linked_fields(result)
 
 
-def get_entities(prj, entity, additional_fields=None, additional_filters=None):
+def get_entities(prj, entity, additional_fields=None, additional_filters=None, preset='default', use_cache=True):
     """
     Given data returns a list of all entities
 
     : project: (str) project code
     : name: (str) name of a playlist to return
     : id (int) id for a playlist
-    : additional_fields: (list) additional fields the user wants information back
+    : additional_fields: (list) additional fields the user wants information back. Linked field paths like
+                         'sg_parent.Asset.code' come back nested under the link field
+    : preset: (str) name of the field preset to query
+    : use_cache: (bool) if False will skip the query cache and snapshot and always go to Shotgrid
 
     :return: (dict) Shotgrid query data for an entity
     """
@@ -136,16 +1742,165 @@ def get_entities(prj, entity, additional_fields=None, additional_filters=None):
         additional_fields = []
 
     # get our fields based on the entity passed in
-    sg_fields = entity_fields[entity]
-
-    sg_fields.extend(additional_fields)
-    sg_fields = list(set(sg_fields))
+    sg_fields = get_fields(entity, preset, additional_fields)
 
     # add our project filter
     sg_filters = [bron_paths.project_filters[prj]]
     sg_filters.extend(additional_filters)
 
-    return sg.find(entity, sg_filters, sg_fields)
+    # see if we can answer this from our local snapshot first
+    if use_cache and snapshot_store:
+        found, records = snapshot_store.find(prj, entity, sg_filters, sg_fields)
+        if found:
+            return records
+
+    usage_before = sg.thread_calls(), sg.thread_bytes()
+    result = _find(entity, sg_filters, sg_fields, use_cache=use_cache)
+    _record_preset_stats(entity, preset, result, usage_before)
+
+    return [_nest_linked_fields(record) for record in result]
+
+
+def get_entities_by_code(prj, entity, codes, additional_fields=None, preset='default', chunk_size=None,
+                         max_workers=4):
+    """
+    Looks up a list of entities by their codes. The codes are split into 'code in' chunks and the chunks
+    are queried at the same time. Shotgrid matches codes without caring about case, so the results are
+    matched back to the codes asked for the same way
+
+    :param prj: (str) project code
+    :param entity: (str) Entity type to query
+    :param codes: (list) Codes to look up
+    :param additional_fields: (list) additional fields the user wants information back
+    :param preset: (str) name of the field preset to query
+    :param chunk_size: (int) Max number of codes in each query. Defaults to id_chunk_size
+    :param max_workers: (int) Max number of chunks queried at once
+    :return: (tuple) (found, missing). Entity data keyed by the code that was asked for and a list of the
+             codes that could not be found
+    """
+    codes = list(dict.fromkeys(codes))
+    chunks = list(_chunks(codes, chunk_size or id_chunk_size))
+
+    def fetch(chunk):
+        return get_entities(prj,
+                            entity,
+                            additional_fields=additional_fields,
+                            additional_filters=[['code', 'in', chunk]],
+                            preset=preset)
+
+    requested = {}
+    for code in codes:
+        requested.setdefault(str(code).lower(), []).append(code)
+
+    found = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        for records in executor.map(fetch, chunks):
+            for record in records:
+                for code in requested.get(str(record['code']).lower(), []):
+                    found[code] = record
+
+    # keep the order the codes were asked for
+    found = {code: found[code] for code in codes if code in found}
+
+    missing = [code for code in codes if code not in found]
+    if missing:
+        print(f'Unable to find {len(missing)} of {len(codes)} {entity} codes: {", ".join(map(str, missing))}')
+
+    return found, missing
+
+
+def iter_entities(prj, entity, additional_fields=None, additional_filters=None, preset='default', page_size=500,
+                  prefetch=False):
+    """
+    Pages through all the entities for a query and yields them as they arrive so large result sets
+    never have to be held in memory at once
+
+    :param prj: (str) project code
+    :param entity: (str) Entity type to query
+    :param additional_fields: (list) additional fields the user wants information back. Linked field paths like
+                              'sg_parent.Asset.code' come back nested under the link field
+    :param additional_filters: (list) additional filters to apply to the query
+    :param preset: (str) name of the field preset to query
+    :param page_size: (int) Number of records pulled from Shotgrid at a time
+    :param prefetch: (bool) If True the next page is pulled on a background thread while the current
+                     page is being worked on
+    :return: (generator) Shotgrid query data for each entity
+    """
+    sg_fields = get_fields(entity, preset, additional_fields)
+
+    sg_filters = [bron_paths.project_filters[prj]]
+    sg_filters.extend(additional_filters or [])
+
+    # order by id so the pages stay stable while we go through them
+    sg_order = [{'field_name': 'id', 'direction': 'asc'}]
+
+    def get_page(page):
+        return sg.find(entity, sg_filters, sg_fields, order=sg_order, limit=page_size, page=page)
+
+    if not prefetch:
+        page = 1
+        while True:
+            records = get_page(page)
+            yield from map(_nest_linked_fields, records)
+
+            if len(records) < page_size:
+                return
+            page += 1
+
+    # pull pages on a background thread, only ever holding one page ahead of the consumer
+    pages = queue.Queue(maxsize=1)
+    done = threading.Event()
+
+    def put(item):
+        # keep trying to hand the page over until the consumer takes it or goes away
+        while not done.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def producer():
+        page = 1
+        try:
+            while not done.is_set():
+                records = get_page(page)
+                put(records)
+
+                if len(records) < page_size:
+                    return
+                page += 1
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=producer, name='ShotgridPrefetch', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            records = pages.get()
+            if isinstance(records, Exception):
+                raise records
+
+            yield from map(_nest_linked_fields, records)
+
+            if len(records) < page_size:
+                return
+    finally:
+        done.set()
+
+
+def get_entity_fields(entity, sg_id, fields):
+    """
+    Gets a fresh copy of just a few fields for a single entity. Skips the cache and snapshot
+
+    :param entity: (str) Entity type to query
+    :param sg_id: (int) id of the entity
+    :param fields: (list) Fields to return
+    :return: (dict) Shotgrid query data for the entity
+    """
+    return sg.find_one(entity, [['id', 'is', sg_id]], list(fields))
 
 
 def get_user(name):
@@ -155,97 +1910,975 @@ def get_user(name):
     :return: (dict) user entity
     """
     # finds human user entity
-    user_filter = [['login', 'is', name]]
-    user_fields = ['login']
-    user = sg.find_one('HumanUser', user_filter, user_fields)
+    user = reference_index.user(name)
 
     return user
 
 
-def get_assets_from_shot(prj, episode, scene, shot):
+def get_assets_from_shot(prj, episode, scene, shot, asset_fields=None):
     """
-    Gets all the valid assets for a shot
+    Gets all the valid assets for a shot. The scene is resolved through the linked scene code so this is a
+    single Shot query
     :param prj: (str) short code for current project
     :param episode: (int) Episode number
     :param scene: (int) Scene number
     :param shot: (int) Shot number
-    :return:
+    :param asset_fields: (list) Asset fields to pull for each asset, e.g. ['sg_asset_type']. If not given the
+                         linked asset entities are returned as they come off the shot
+    :return: (list) Assets linked to the shot
     """
 
     shot_code = bron_paths.shot_code[prj].format(Episode=episode,
                                                  Scene=scene,
                                                  Shot=shot)
 
-    project = sg.find_one("Project", [["name", "contains", "Gossamer"]], ["name"])
-    scene = get_entity(prj, 'Scene', name=str(scene), additional_fields=['assets'])
-    shot = sg.find("Shot",
-                   [
-                       bron_paths.project_filters[prj],
-                       ["sg_scene", "is", scene],
-                       ["code", "is", shot_code]
-                   ],
-                   [
-                       "assets"
-                   ]
-                   )
-    assets = shot[0]["assets"]
+    shots = _get_shot_assets(prj,
+                             [["sg_scene.Scene.code", "is", str(scene)],
+                              ["code", "is", shot_code]],
+                             asset_fields)
+
+    if not shots:
+        print(f'Unable to find shot {shot_code}')
+        return None
+
+    return shots[shot_code]
+
+
+def get_assets_from_scene(prj, episode, scene, asset_fields=None):
+    """
+    Gets the valid assets for every shot in a scene in one go
+
+    :param prj: (str) short code for current project
+    :param episode: (int) Episode number
+    :param scene: (int) Scene number
+    :param asset_fields: (list) Asset fields to pull for each asset. If not given the linked asset entities
+                         are returned as they come off the shots
+    :return: (dict) Asset lists keyed by shot code
+    """
+    # scene numbers repeat across episodes so also match on the episode and scene part of the shot code
+    shot_prefix = bron_paths.shot_code[prj].format(Episode=episode, Scene=scene, Shot=0).rpartition('_')[0]
+
+    return _get_shot_assets(prj,
+                            [["sg_scene.Scene.code", "is", str(scene)],
+                             ["code", "starts_with", f"{shot_prefix}_"],
+                             ["sg_status_list", "is_not", "omt"]],
+                            asset_fields)
+
+
+def _get_shot_assets(prj, filters, asset_fields=None):
+    """
+    Finds shots and the assets linked to them. Shotgrid can't return deep-linked fields through a
+    multi-entity field like assets, so when asset fields are asked for they come from one bulk Asset query
+    over every asset on the shots rather than one query per shot
+
+    :param prj: (str) short code for current project
+    :param filters: (list) Shot filters on top of the project filter
+    :param asset_fields: (list) Asset fields to pull for each asset
+    :return: (dict) Asset lists keyed by shot code
+    """
+    project_filter = bron_paths.project_filters[prj]
+    shots = {shot['code']: shot['assets'] or []
+             for shot in _find("Shot", [project_filter] + filters, ["code", "assets"])}
+
+    if asset_fields:
+        asset_ids = sorted({asset['id'] for assets in shots.values() for asset in assets})
+        found = {}
+
+        for chunk in _chunks(asset_ids, id_chunk_size):
+            for asset in _find('Asset', [project_filter, ['id', 'in', chunk]], ['code'] + list(asset_fields)):
+                found[asset['id']] = asset
 
-    return assets
+        shots = {code: [found.get(asset['id'], asset) for asset in assets] for code, assets in shots.items()}
+
+    return shots
+
+
+def prefetch_episode(prj, episode, ttl=900):
+    """
+    Pulls the Scenes, Shots and linked Assets for a whole episode in a handful of bulk queries and seeds
+    the query cache with them. The lookups the sequence classes make for each scene and shot are then
+    answered from the cache rather than going to Shotgrid one at a time
+
+    :param prj: (str) project code
+    :param episode: (str) Episode code
+    :param ttl: (int) Seconds to hold the prefetched data in the cache
+    :return: (dict) Episode, scenes and shots keyed by code, assets keyed by id and number of queries made
+    """
+    project_filter = bron_paths.project_filters[prj]
+
+    episode_data = get_entity(prj, 'Episode', name=episode)
+    queries = 1
+
+    if not episode_data:
+        print(f'Unable to find episode {episode}')
+        return None
+
+    result = dict(episode=episode_data,
+                  scenes={},
+                  shots={},
+                  assets={},
+                  queries=0)
+
+    # get all the scenes in the episode
+    scene_fields = get_fields('Scene')
+    scenes = sg.find('Scene',
+                     [project_filter, [episode_link_field, 'is', {'type': 'Episode', 'id': episode_data['id']}]],
+                     scene_fields)
+    queries += 1
+
+    # get all the valid shots across all the scenes
+    shot_fields = get_fields('Shot')
+    shots = []
+
+    for chunk in _chunks([{'type': 'Scene', 'id': i['id']} for i in scenes], id_chunk_size):
+        shots.extend(sg.find('Shot',
+                             [project_filter, ['sg_scene', 'in', chunk], ['sg_status_list', 'is_not', 'omt']],
+                             shot_fields + ['sg_scene']))
+        queries += 1
+
+    # get all the assets linked to those shots
+    asset_fields = get_fields('Asset')
+    asset_ids = sorted({asset['id'] for shot in shots for asset in shot['assets'] or []})
+
+    for chunk in _chunks(asset_ids, id_chunk_size):
+        for asset in sg.find('Asset', [project_filter, ['id', 'in', chunk]], asset_fields):
+            result['assets'][asset['id']] = asset
+        queries += 1
+
+    # seed the cache with the same queries get_entity and get_entities would make
+    def seed(method, entity, filters, fields, data):
+        key = QueryCache.make_key(method, entity, [project_filter] + filters, fields)
+        query_cache.put(key, data, ttl=ttl)
+
+    scene_shots = {}
+    for shot in shots:
+        scene_id = shot.pop('sg_scene')['id']
+        scene_shots.setdefault(scene_id, []).append(shot)
+
+        result['shots'][shot['code']] = shot
+        seed('find_one', 'Shot', [['code', 'is', shot['code']]], shot_fields, shot)
+
+    for scene in scenes:
+        result['scenes'][scene['code']] = scene
+
+        seed('find_one', 'Scene', [['code', 'is', scene['code']]], scene_fields, scene)
+        seed('find', 'Shot',
+             [['sg_scene', 'is', {'type': "Scene", 'id': scene['id']}], ['sg_status_list', 'is_not', "omt"]],
+             shot_fields, scene_shots.get(scene['id'], []))
+
+    for asset in result['assets'].values():
+        seed('find_one', 'Asset', [['id', 'is', asset['id']]], asset_fields, asset)
+
+    result['queries'] = queries
+    print(f'Prefetched {len(scenes)} scenes, {len(shots)} shots and {len(asset_ids)} assets '
+          f'in {queries} queries')
+
+    return result
 
 
 # ### ---------------------------------------------------------------------------------------- ###
 # ### Update functions
 
+def update_entity(entity, sg_id, data):
+    """
+    Updates an entity in Shotgrid and drops any cached or snapshot data for that entity type
+
+    :param entity: (str) Entity type to update
+    :param sg_id: (int) id of the entity to update
+    :param data: (dict) Field data to update on the entity
+    :return: (dict) Shotgrid update result
+    """
+    result = sg.update(entity, sg_id, data)
+    query_cache.invalidate(entity)
+
+    if snapshot_store:
+        snapshot_store.expire(entity)
 
-def update_pipeline_step(scene, department):
+    return result
+
+
+class WriteQueue:
     """
-    Legacy function. Will attempt to update the pipeline step for versions in a scene
-    :param scene:
-    :param department:
-    :return:
+    Write-behind queue for creates and updates. Writes are held in memory and sent to Shotgrid through
+    sg.batch once enough have built up, after a short delay or when flush is called. Updates to an entity
+    that is still waiting to be sent are merged into one request. Each write returns a Future that
+    resolves to the Shotgrid result for that request or raises the error it hit.
+    """
+
+    def __init__(self, max_size=100, max_delay=2.0):
+        """
+        :param max_size: (int) Number of pending writes that triggers a flush. Also the batch size
+        :param max_delay: (float) Seconds a write can wait before the queue is flushed. None to only flush
+                          on size or when asked
+        """
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._updates = {}
+        self._timer = None
+        self._stats = dict(queued=0, coalesced=0, sent=0, failed=0, batches=0)
+
+    def create(self, entity, data):
+        """
+        Queues a create
+
+        :param entity: (str) Entity type to create
+        :param data: (dict) Field data for the new entity
+        :return: (Future) Resolves to the created entity
+        """
+        request = dict(request_type='create', entity_type=entity, data=dict(data))
+
+        return self._add(request)
+
+    def update(self, entity, sg_id, data):
+        """
+        Queues an update. If an update for the same entity is still pending the data is merged into it,
+        with the newer values winning
+
+        :param entity: (str) Entity type to update
+        :param sg_id: (int) id of the entity to update
+        :param data: (dict) Field data to update on the entity
+        :return: (Future) Resolves to the updated entity
+        """
+        request = dict(request_type='update', entity_type=entity, entity_id=sg_id, data=dict(data))
+
+        return self._add(request, key=(entity, sg_id))
+
+    def flush(self):
+        """
+        Sends everything that is pending. Flushes are run one at a time so writes reach Shotgrid in the
+        order they were queued
+
+        :return: (dict) Number of requests sent and failed in this flush
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._updates = self._pending, [], {}
+
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+
+            result = dict(sent=0, failed=0)
+
+            for chunk in _chunks(pending, self.max_size):
+                self._send(chunk, result)
+
+            with self._lock:
+                self._stats['sent'] += result['sent']
+                self._stats['failed'] += result['failed']
+
+            return result
+
+    def pending(self):
+        """
+        :return: (int) Number of requests waiting to be sent
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        """
+        :return: (dict) Counts of queued, coalesced, sent and failed writes and the batches sent
+        """
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def _add(self, request, key=None):
+        """
+        Adds a request to the queue, merging it into a pending update for the same entity if there is one
+
+        :param request: (dict) sg.batch request
+        :param key: (tuple) (entity, id) for updates
+        :return: (Future) Future for the request
+        """
+        future = Future()
+
+        with self._lock:
+            self._stats['queued'] += 1
+            item = self._updates.get(key) if key else None
+
+            if item:
+                item['request']['data'].update(request['data'])
+                item['futures'].append(future)
+                self._stats['coalesced'] += 1
+            else:
+                item = dict(request=request, futures=[future])
+                self._pending.append(item)
+
+                if key:
+                    self._updates[key] = item
+
+            full = len(self._pending) >= self.max_size
+
+            if not full and self.max_delay and not self._timer:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+        return future
+
+    def _send(self, chunk, result):
+        """
+        Sends a chunk of requests in one batch call. sg.batch is all or nothing, so if Shotgrid rejects it
+        each request is sent on its own to find which ones are bad and only those futures get the error.
+        Any other failure (timeouts, dropped connections) may have happened after the batch went through,
+        so nothing is replayed and every future in the chunk gets the error
+
+        :param chunk: (list) Pending items to send
+        :param result: (dict) Sent and failed counts to add to
+        :return: None
+        """
+        entities = {item['request']['entity_type'] for item in chunk}
+
+        try:
+            with self._lock:
+                self._stats['batches'] += 1
+
+            responses = sg.batch([item['request'] for item in chunk])
+            outcomes = [(response, None) for response in responses]
+
+        except shotgun_api3.Fault as e:
+            print(f'Batch of {len(chunk)} writes was rejected, retrying one at a time: {e}')
+            outcomes = []
+
+            for item in chunk:
+                request = item['request']
+
+                try:
+                    if request['request_type'] == 'create':
+                        response = sg.create(request['entity_type'], request['data'])
+                    else:
+                        response = sg.update(request['entity_type'], request['entity_id'], request['data'])
+
+                    outcomes.append((response, None))
+
+                except Exception as error:
+                    print(f'Failed to {request["request_type"]} {request["entity_type"]}: {error}')
+                    outcomes.append((None, error))
+
+        except Exception as e:
+            print(f'Batch of {len(chunk)} writes failed: {e}')
+            outcomes = [(None, e)] * len(chunk)
+
+        for item, (response, error) in zip(chunk, outcomes):
+            for future in item['futures']:
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(response)
+
+            result['failed' if error else 'sent'] += 1
+
+        for entity in entities:
+            query_cache.invalidate(entity)
+
+            if snapshot_store:
+                snapshot_store.expire(entity)
+
+
+write_queue = WriteQueue()
+atexit.register(write_queue.flush)
+
+
+def queue_create(entity, data):
+    """
+    Queues a create on the shared write queue
+
+    :param entity: (str) Entity type to create
+    :param data: (dict) Field data for the new entity
+    :return: (Future) Resolves to the created entity
+    """
+    return write_queue.create(entity, data)
+
+
+def queue_update(entity, sg_id, data):
+    """
+    Queues an update on the shared write queue
+
+    :param entity: (str) Entity type to update
+    :param sg_id: (int) id of the entity to update
+    :param data: (dict) Field data to update on the entity
+    :return: (Future) Resolves to the updated entity
+    """
+    return write_queue.update(entity, sg_id, data)
+
+
+def flush_writes():
+    """
+    Sends all pending writes on the shared write queue
+
+    :return: (dict) Number of requests sent and failed
+    """
+    return write_queue.flush()
+
+
+@_batch_job
+def update_pipeline_step(scene, department, prj='GS', episode=None, chunk_size=100, dry_run=False):
+    """
+    Legacy function. Will attempt to update the pipeline step for versions in a scene. All the versions
+    are found in bulk and the updates are sent through in batches
+
+    :param scene: (str|list) Scene code or list of scene codes to update. If None all the scenes in
+                  the episode are updated
+    :param department: (str) Department code. Also used to look up the pipeline step
+    :param prj: (str) Project code
+    :param episode: (str) Episode code the scenes belong to. Scene codes repeat across episodes so
+                    without it each scene code has to match a single scene
+    :param chunk_size: (int) Number of updates sent through in each batch
+    :param dry_run: (bool) If True will only report what would be updated
+    :return: (dict) Number of versions planned for update and updated
     """
     # get the pipeline step that relates to the department
     pipe_step = get_pipeline_step('Shot', code=department)
+    if not pipe_step:
+        return None
+
+    # work out which scenes we are sweeping
+    filters = [bron_paths.project_filters[prj]]
 
-    # finds all versions and fills in the pipeline step for the version
+    if not scene and not episode:
+        print('No scene or episode passed in. Cannot update pipeline steps')
+        return None
 
-    # todo: make the project set more generic instead of hard coded
-    filters = list(['code', 'is', scene])
-    filters.append(bron_paths.project_filters['GS'])
+    if episode:
+        episode_data = get_entity(prj, 'Episode', name=episode)
+        if not episode_data:
+            print(f'Unable to find episode {episode}')
+            return None
+        filters.append([episode_link_field, 'is', {'type': 'Episode', 'id': episode_data['id']}])
 
-    fields = ['shots']
+    scene_codes = []
+    if scene:
+        scene_codes = [scene] if isinstance(scene, str) else list(scene)
+        filters.append(['code', 'in', scene_codes])
+
+    fields = ['shots', 'code']
     scenes = sg.find('Scene', filters, fields)
 
-    if not len(scenes) == 1:
-        print('Should only find one scene but found {}'.format(len(scenes)))
+    if not scenes:
+        print(f'Unable to find any scenes for {scene or episode}')
+        return None
+
+    # without an episode a scene code could pick up the scene with the same number in every episode
+    if not episode:
+        found = {}
+        for scene_data in scenes:
+            found.setdefault(str(scene_data['code']).lower(), []).append(scene_data)
+
+        ambiguous = [code for code in scene_codes if len(found.get(str(code).lower(), [])) > 1]
+        if ambiguous:
+            print(f'Should only find one scene for each code but found more for {ambiguous}. Pass in an episode')
+            return None
+
+    shots = [shot for scene_data in scenes for shot in scene_data['shots']]
+
+    # find all the versions missing a pipeline step across all the shots at once
+    version_fields = ['sg_department', 'sg_pipeline_step']
+    versions = []
+
+    for chunk in _chunks(shots, id_chunk_size):
+        version_filter = [['entity', 'in', chunk],
+                          ['sg_department', 'is', department],
+                          ['sg_pipeline_step', 'is', None]]
+
+        versions.extend(sg.find('Version', version_filter, version_fields))
+
+    requests = [dict(request_type='update',
+                     entity_type='Version',
+                     entity_id=version['id'],
+                     data={'sg_pipeline_step': pipe_step}) for version in versions]
+
+    result = dict(scenes=len(scenes),
+                  shots=len(shots),
+                  planned=len(requests),
+                  updated=0)
+
+    if dry_run:
+        print(f'Dry run: {len(requests)} versions across {len(shots)} shots need a pipeline step')
+        return result
+
+    # push the updates through in batches. Earlier batches are already committed if a later one fails
+    # so the cached versions have to be dropped either way
+    try:
+        for chunk in _chunks(requests, chunk_size):
+            sg.batch(chunk)
+            result['updated'] += len(chunk)
+
+    except Exception:
+        print(f'Updated the pipeline step on {result["updated"]} of {len(requests)} versions before failing')
+        raise
+
+    finally:
+        if result['updated']:
+            query_cache.invalidate('Version')
+
+            if snapshot_store:
+                snapshot_store.expire('Version')
+
+    print(f'Updated the pipeline step on {result["updated"]} versions')
+
+    return result
+
+
+# ### ---------------------------------------------------------------------------------------- ###
+# ### Event functions
+
+class EventWatcher(threading.Thread):
+    """
+    Background thread that tails the Shotgrid EventLogEntry table. Any changes to the entity types we
+    watch drop the cached and snapshot data for that type and are passed on to subscribers so they can
+    refresh just the fields that changed. The id of the last event processed is saved to disk so we pick
+    up where we left off.
+    """
+    entities = ('Shot', 'Scene', 'Asset', 'Version', 'Playlist')
+
+    def __init__(self, state_path, interval=5, batch_size=500):
+        """
+        :param state_path: (str) Path to the json file holding the last event id we processed
+        :param interval: (int) Seconds to wait between polls
+        :param batch_size: (int) Max number of events to pull in each poll
+        """
+        super().__init__(name='ShotgridEventWatcher', daemon=True)
+
+        self.state_path = state_path
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.last_event_id = self._load_state()
+
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._next_token = 0
+
+    def subscribe(self, entity, callback, sg_id=None):
+        """
+        Registers a callback for changes to an entity type
+
+        :param entity: (str) Entity type to listen for
+        :param callback: (function) Called with (entity, sg_id, fields). fields is a list of the fields that
+                         changed or None if the whole record should be refreshed
+        :param sg_id: (int) If given only changes to this entity are passed on
+        :return: (int) Token to unsubscribe with
+        """
+        with self._lock:
+            self._next_token += 1
+            self._subscribers[self._next_token] = (entity, sg_id, callback)
+
+            return self._next_token
+
+    def unsubscribe(self, token):
+        """
+        Removes a callback
+
+        :param token: (int) Token returned from subscribe
+        :return: None
+        """
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def stop(self):
+        """
+        Stops the watcher after the current poll
+        """
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with batch_lane():
+                    self.poll()
+            except Exception as e:
+                print(f'Failed to poll Shotgrid events: {e}')
+
+            self._stop_event.wait(self.interval)
+
+    def poll(self):
+        """
+        Pulls any new events and passes them on
+
+        :return: (int) Number of events processed
+        """
+        # if this is the first time running start from the latest event rather than replaying history
+        if self.last_event_id is None:
+            latest = sg.find_one('EventLogEntry', [], ['id'], order=[{'field_name': 'id', 'direction': 'desc'}])
+            self.last_event_id = latest['id'] if latest else 0
+            self._save_state()
+            return 0
+
+        event_filters = [['id', 'greater_than', self.last_event_id],
+                         ['event_type', 'in', [f'Shotgun_{i}_{j}' for i in self.entities
+                                               for j in ('New', 'Change', 'Retirement', 'Revival')]]]
+        event_fields = ['id', 'event_type', 'attribute_name', 'entity', 'meta']
+        event_order = [{'field_name': 'id', 'direction': 'asc'}]
+
+        events = sg.find('EventLogEntry', event_filters, event_fields, order=event_order, limit=self.batch_size)
+        if not events:
+            return 0
+
+        # collect up the changes so each entity only gets one notification per poll
+        changes = OrderedDict()
+        for event in events:
+            entity, sg_id, field = self._parse_event(event)
+            if not entity or not sg_id:
+                continue
+
+            key = (entity, sg_id)
+            fields = changes.get(key, set())
+
+            # anything other than a field change means the whole record needs refreshing
+            if fields is None or not field:
+                changes[key] = None
+            else:
+                fields.add(field)
+                changes[key] = fields
+
+        # drop any stale data we are holding for the records that changed
+        query_cache.invalidate_records(changes)
+
+        if snapshot_store:
+            for entity in {i[0] for i in changes}:
+                snapshot_store.expire(entity)
+
+        for (entity, sg_id), fields in changes.items():
+            self._notify(entity, sg_id, sorted(fields) if fields is not None else None)
+
+        self.last_event_id = events[-1]['id']
+        self._save_state()
+
+        return len(events)
+
+    @staticmethod
+    def _parse_event(event):
+        """
+        Pulls the entity and field that changed out of an event
+
+        :param event: (dict) EventLogEntry data
+        :return: (tuple) (entity type, entity id, field). field is None unless a single field changed
+        """
+        meta = event.get('meta') or {}
+        entity_data = event.get('entity') or {}
+
+        entity = meta.get('entity_type') or entity_data.get('type')
+        sg_id = meta.get('entity_id') or entity_data.get('id')
+
+        field = None
+        if event['event_type'].endswith('_Change'):
+            field = event.get('attribute_name') or meta.get('attribute_name')
+
+        return entity, sg_id, field
+
+    def _notify(self, entity, sg_id, fields):
+        """
+        Passes a change on to any subscribers listening for it
+
+        :param entity: (str) Entity type that changed
+        :param sg_id: (int) id of the entity that changed
+        :param fields: (list) Fields that changed or None if the whole record changed
+        :return: None
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+
+        for sub_entity, sub_id, callback in subscribers:
+            if sub_entity != entity or (sub_id is not None and sub_id != sg_id):
+                continue
+
+            try:
+                callback(entity, sg_id, fields)
+            except Exception as e:
+                print(f'Event callback failed for {entity} {sg_id}: {e}')
+
+    def _load_state(self):
+        """
+        Loads the last event id we processed from disk
+
+        :return: (int) Last event id or None if we haven't run before
+        """
+        if not os.path.exists(self.state_path):
+            return None
+
+        with open(self.state_path) as f:
+            return json.load(f).get('last_event_id')
+
+    def _save_state(self):
+        """
+        Saves the last event id we processed to disk
+        """
+        folder = os.path.dirname(self.state_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with open(self.state_path, 'w') as f:
+            json.dump(dict(last_event_id=self.last_event_id), f)
+
+
+# reloading this module would otherwise leave the old watcher thread polling alongside a new one
+if globals().get('event_watcher'):
+    event_watcher.stop()
+
+event_watcher = None
+
+
+def start_event_watcher(state_path, interval=5):
+    """
+    Starts watching Shotgrid events in the background
+
+    :param state_path: (str) Path to the json file holding the last event id we processed
+    :param interval: (int) Seconds to wait between polls
+    :return: (EventWatcher) the running watcher
+    """
+    global event_watcher
+    if event_watcher and event_watcher.is_alive():
+        return event_watcher
+
+    event_watcher = EventWatcher(state_path, interval=interval)
+    event_watcher.start()
+
+    return event_watcher
+
+
+def stop_event_watcher():
+    """
+    Stops watching Shotgrid events
+    """
+    global event_watcher
+    if event_watcher:
+        event_watcher.stop()
+        event_watcher = None
+
+
+def subscribe(entity, callback, sg_id=None):
+    """
+    Registers a callback with the event watcher for changes to an entity type
+
+    :param entity: (str) Entity type to listen for
+    :param callback: (function) Called with (entity, sg_id, fields) when the entity changes
+    :param sg_id: (int) If given only changes to this entity are passed on
+    :return: (int) Token to unsubscribe with. None if the watcher isn't running
+    """
+    if not event_watcher:
+        print('Event watcher is not running. Call start_event_watcher first')
         return None
 
-    scene_data = scenes[0]
+    return event_watcher.subscribe(entity, callback, sg_id=sg_id)
 
-    for shot in scene_data['shots']:
-        version_filter = [['entity', 'is', shot],
-                          ['sg_department', 'is', department]]
-        version_fields = ['sg_department', 'sg_pipeline_step']
 
-        versions = sg.find('Version', version_filter, version_fields)
+def unsubscribe(token):
+    """
+    Removes a callback from the event watcher
 
-        for version in versions:
-            if version['sg_pipeline_step'] is None:
-                print('No pipeline step found!')
-                data = {'sg_pipeline_step': pipe_step}
-                sg.update('Version', version['id'], data)
+    :param token: (int) Token returned from subscribe
+    """
+    if event_watcher:
+        event_watcher.unsubscribe(token)
 
 
 # ### ---------------------------------------------------------------------------------------- ###
 # ### Review functions
 
-def download_playlist(prj, name=None, sg_id=None):
+class AttachmentDownloader:
+    """
+    Downloads Shotgrid attachments on a bounded pool of worker threads. Each file is streamed in chunks
+    to a .part file next to its destination and only renamed into place once complete, so a file on
+    disk is always a finished download. Interrupted downloads are resumed from the .part file with a
+    range request the next time they are queued.
+    """
+    part_suffix = '.part'
+
+    def __init__(self, client=None, max_workers=4, max_per_host=2, chunk_size=1024 * 1024):
+        """
+        :param client: (Shotgun) Shotgrid connection used to resolve download urls. Defaults to sg
+        :param max_workers: (int) Max number of files downloading at once
+        :param max_per_host: (int) Max number of files downloading at once from a single host
+        :param chunk_size: (int) Number of bytes read from the connection at a time
+        """
+        self.client = client or sg
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.chunk_size = chunk_size
+
+        self._queue = {}
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+    def add(self, attachment, file_path):
+        """
+        Queues an attachment to be downloaded. A path that is already queued is only downloaded once
+
+        :param attachment: (dict) Shotgrid attachment data, eg sg_uploaded_movie from a Version
+        :param file_path: (str) Path on disk we want the attachment downloaded to
+        """
+        self._queue.setdefault(file_path, attachment)
+
+    def run(self):
+        """
+        Downloads everything that has been queued
+
+        :return: (dict) Stats for the run. Files downloaded, failed files, bytes transferred,
+                 seconds taken and throughput in MB/s
+        """
+        queue, self._queue = self._queue, {}
+        self._bytes = 0
+
+        # set up our url opener once with the shotgrid session so the workers can share it
+        handlers = [self.client.get_auth_cookie_handler()]
+        if self.client.config.proxy_handler:
+            handlers.append(self.client.config.proxy_handler)
+        opener = urllib.request.build_opener(*handlers)
+
+        downloaded = []
+        failed = []
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._download, opener, attachment, file_path): file_path
+                       for file_path, attachment in queue.items()}
+
+            for future, file_path in futures.items():
+                try:
+                    future.result()
+                    downloaded.append(file_path)
+                except Exception as e:
+                    print(f'Failed to download {file_path}: {e}')
+                    failed.append(file_path)
+
+        seconds = time.time() - start
+        throughput = (self._bytes / (1024 * 1024)) / seconds if seconds else 0.0
+
+        print(f'Downloaded {len(downloaded)} files, {self._bytes} bytes in {seconds:.1f}s ({throughput:.2f} MB/s)')
+
+        return dict(downloaded=downloaded,
+                    failed=failed,
+                    bytes=self._bytes,
+                    seconds=seconds,
+                    throughput=throughput)
+
+    def _host_slot(self, url):
+        """
+        Gets the semaphore limiting the number of downloads from the host in a url
+
+        :param url: (str) url we are about to download from
+        :return: (threading.Semaphore) semaphore for the host
+        """
+        host = urllib.parse.urlparse(url).netloc
+
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.Semaphore(self.max_per_host)
+
+            return self._host_slots[host]
+
+    def _download(self, opener, attachment, file_path):
+        """
+        Streams a single attachment to disk, resuming a partial download if there is one
+
+        :param opener: (urllib.request.OpenerDirector) Opener holding our shotgrid session
+        :param attachment: (dict) Shotgrid attachment data
+        :param file_path: (str) Path on disk we want the attachment downloaded to
+        :return: (str) Path to the downloaded file
+        """
+        url = self.client.get_attachment_download_url(attachment)
+        part_path = file_path + self.part_suffix
+
+        # make sure the folder exists first
+        folder = os.path.dirname(file_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        with self._host_slot(url):
+            # if we have a partial download then only ask for what we are missing
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+            request = urllib.request.Request(url)
+            if offset:
+                request.add_header('Range', f'bytes={offset}-')
+
+            try:
+                response = opener.open(request)
+            except urllib.error.HTTPError as e:
+                # a 416 means there is nothing left to send. If the .part file is the full size then it is
+                # already complete, otherwise it is no good to us and we start again next time
+                if e.code != 416:
+                    raise
+
+                if self._total_size(e.headers) != offset:
+                    os.remove(part_path)
+                    raise
+
+                response = None
+
+            if response:
+                with response:
+                    # if the server ignored our range request we need to start again from scratch
+                    if offset and response.status != 206:
+                        offset = 0
+
+                    expected = self._total_size(response.headers, offset)
+
+                    with open(part_path, 'ab' if offset else 'wb') as fp:
+                        while True:
+                            chunk = response.read(self.chunk_size)
+                            if not chunk:
+                                break
+
+                            fp.write(chunk)
+                            with self._lock:
+                                self._bytes += len(chunk)
+
+                # a dropped connection just ends the read, so make sure we actually got everything.
+                # the .part file is kept so the next run can resume it
+                size = os.path.getsize(part_path)
+                if expected is not None and size != expected:
+                    raise IOError(f'Incomplete download. Got {size} of {expected} bytes')
+
+        # only move the file into place once we have all of it
+        os.replace(part_path, file_path)
+
+        return file_path
+
+    @staticmethod
+    def _total_size(headers, offset=0):
+        """
+        Gets the full size of the file being downloaded from the response headers. For a range response
+        this is the total from Content-Range rather than the size of the range
+
+        :param headers: (http.client.HTTPMessage) Response headers
+        :param offset: (int) Byte the response starts at. Added to Content-Length if there is no Content-Range
+        :return: (int) Size in bytes or None if the server didn't tell us
+        """
+        content_range = headers.get('Content-Range')
+        if content_range:
+            total = content_range.rpartition('/')[-1]
+            return int(total) if total.isdigit() else None
+
+        content_length = headers.get('Content-Length')
+        return offset + int(content_length) if content_length and content_length.isdigit() else None
+
+
+@_batch_job
+def download_playlist(prj, name=None, sg_id=None, max_workers=4, max_per_host=2):
     """
     :prj: (str) Project code
     :name: (str) name of playlist to download
     :sg_id: (int) id of project to download)
+    :max_workers: (int) Max number of movies downloading at once
+    :max_per_host: (int) Max number of movies downloading at once from a single host
 
+    :return: (dict) Summary of the download. Holds the codes of the versions downloaded and skipped as well
+             as the number of Shotgrid round trips it took to resolve the playlist
     """
+    # count the calls that actually go to shotgrid rather than the ones answered from the cache
+    calls_before = sg.thread_calls()
+
     # attempt to get the playlist
     playlist = get_entity(prj, 'Playlist', name=name, sg_id=sg_id)
 
@@ -254,11 +2887,32 @@ def download_playlist(prj, name=None, sg_id=None):
         print(f'Unable to find playlist {name} id: {sg_id}')
         return None
 
+    # pull the data for all the versions in bulk rather than querying each version on its own
+    version_ids = [vrs['id'] for vrs in playlist['versions']]
+    version_data = {}
+
+    for chunk in _chunks(version_ids, id_chunk_size):
+        for vrs_data in get_entities(prj, 'Version', additional_filters=[['id', 'in', chunk]], preset='movie'):
+            version_data[vrs_data['id']] = vrs_data
+
+    result = dict(playlist=playlist,
+                  downloaded=[],
+                  skipped=[],
+                  failed=[],
+                  round_trips=sg.thread_calls() - calls_before)
+
+    downloader = AttachmentDownloader(max_workers=max_workers, max_per_host=max_per_host)
+    queued = {}
+
     # go through each version in the playlist
     for vrs in playlist['versions']:
 
         # get the version data and pull the movie path
-        vrs_data = get_entity(prj, 'Version', sg_id=vrs['id'])
+        vrs_data = version_data.get(vrs['id'])
+        if not vrs_data:
+            print(f'Unable to find version {vrs["id"]}')
+            continue
+
         movie_path = vrs_data['sg_path_to_movie']
 
         # check to see if we already have the movie path downloaded
@@ -267,15 +2921,101 @@ def download_playlist(prj, name=None, sg_id=None):
                 print('Cannot find version... Time to download')
                 print(movie_path)
 
-                # get the folder path and make sure it exists first
-                folder = os.path.dirname(movie_path)
-                if not os.path.exists(folder):
-                    os.makedirs(folder)
-
-                # get the attachment and download it
-                attachment = vrs_data['sg_uploaded_movie']
-                sg.download_attachment(attachment['id'], file_path=movie_path)
+                # queue up the attachment to download
+                downloader.add(vrs_data['sg_uploaded_movie'], movie_path)
+                queued.setdefault(movie_path, []).append(vrs_data['code'])
 
             else:
                 # already exists!!!
                 print(f'Version {vrs_data["code"]} already exists ')
+                result['skipped'].append(vrs_data['code'])
+
+    # download everything we are missing
+    if queued:
+        stats = downloader.run()
+
+        result['downloaded'] = [code for i in stats['downloaded'] for code in queued[i]]
+        result['failed'] = [code for i in stats['failed'] for code in queued[i]]
+        result['bytes'] = stats['bytes']
+        result['throughput'] = stats['throughput']
+
+    return result
+
+
+# ### ---------------------------------------------------------------------------------------- ###
+# ### Async functions
+
+# max number of wrapper calls each event loop can have in flight at once
+async_concurrency = 16
+
+_async_executor = None
+_async_limits = weakref.WeakKeyDictionary()
+_async_lock = threading.Lock()
+
+
+def _get_async_executor():
+    """
+    Gets the thread pool our async functions run the wrapper functions on. Sized to the connection pool
+    so every worker can hold a connection
+
+    :return: (ThreadPoolExecutor) executor
+    """
+    global _async_executor
+
+    with _async_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(max_workers=sg_pool.max_size, thread_name_prefix='ShotgridAsync')
+
+        return _async_executor
+
+
+async def _run_async(func, *args, **kwargs):
+    """
+    Runs a blocking wrapper function on our executor without blocking the event loop. If the awaiting task
+    is cancelled before the call starts it never runs, if it has already started the result is thrown away
+
+    :param func: (function) Wrapper function to run
+    :return: whatever the wrapper function returns
+    """
+    loop = asyncio.get_running_loop()
+
+    with _async_lock:
+        semaphore = _async_limits.get(loop)
+        if semaphore is None:
+            semaphore = _async_limits[loop] = asyncio.Semaphore(async_concurrency)
+
+    async with semaphore:
+        return await loop.run_in_executor(_get_async_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def get_entity_async(prj, entity, name=None, sg_id=None, additional_fields=None, additional_filters=None,
+                           preset='default', use_cache=True):
+    """
+    Async version of get_entity
+
+    :return: (dict) Shotgrid query data for an entity
+    """
+    return await _run_async(get_entity, prj, entity, name=name, sg_id=sg_id, additional_fields=additional_fields,
+                            additional_filters=additional_filters, preset=preset, use_cache=use_cache)
+
+
+async def get_entities_async(prj, entity, additional_fields=None, additional_filters=None, preset='default',
+                             use_cache=True):
+    """
+    Async version of get_entities
+
+    :return: (list) Shotgrid query data for the entities
+    """
+    return await _run_async(get_entities, prj, entity, additional_fields=additional_fields,
+                            additional_filters=additional_filters, preset=preset, use_cache=use_cache)
+
+
+async def download_attachment_async(attachment, file_path):
+    """
+    Async version of sg.download_attachment
+
+    :param attachment: (dict) Shotgrid attachment data
+    :param file_path: (str) Path on disk we want the attachment downloaded to
+    :return: (str) Path to the downloaded file
+    """
+    return await _run_async(sg.download_attachment, attachment, file_path=file_path)
@@ -1,10 +1,13 @@
+import collections
+import hashlib
 import io
 import json, pathlib, os, re
+import threading
+from contextlib import contextmanager
 from subprocess import Popen, PIPE
 from importlib import *
 
 import unreal
-import shotgun_api3
 from . import bron_paths, bron_shotgrid
 
 reload(bron_paths)
@@ -18,7 +21,13 @@ except:
     # print(f'Failed to load characters module')
     pass
 
-sg = shotgun_api3.shotgun.Shotgun(#Deleted)
+# share the instrumented connection from bron_shotgrid
+sg = bron_shotgrid.sg
+
+# metadata tag holding the fingerprint of the Shotgrid data a shot sequence was last updated with. For it to
+# be read from the asset registry without loading the sequence the tag needs adding to the
+# 'Metadata Tags For Asset Registry' list in the project settings
+fingerprint_tag = 'BronShotFingerprint'
 
 
 # ## Plugin Setting functions
@@ -151,6 +160,229 @@ def reimport_animation_sequence(anim_sequence, episode, scene):
     import_animation_sequence(destination_name, destination_path, file_path, skeleton)
 
 
+def _get_object_path(asset_path):
+    """
+    Makes sure an asset path is a full object path, e.g. /Game/Shot/Name becomes /Game/Shot/Name.Name
+
+    @param asset_path: (str) package or object path of the asset
+    @return (str): object path of the asset
+    """
+    if '.' in asset_path.rsplit('/', 1)[-1]:
+        return asset_path
+
+    return f"{asset_path}.{asset_path.rsplit('/', 1)[-1]}"
+
+
+class SaveSession:
+    """
+    Collects the assets the Bron classes change so they can be saved together in one bulk save rather
+    than each one hitting the disk and source control on its own
+    """
+
+    def __init__(self, skip_unchanged=True):
+        """
+        @param skip_unchanged: (bool) If True assets that aren't dirty when the session is flushed are not saved
+        """
+        self.skip_unchanged = skip_unchanged
+        self.assets = {}
+
+    def add(self, asset):
+        """
+        Registers an asset to be saved when the session is flushed
+
+        @param asset: (unreal.Object) asset to save
+        """
+        if asset:
+            self.assets[asset.get_path_name()] = asset
+
+    def flush(self):
+        """
+        Saves all the registered assets. If the bulk save fails each asset is saved on its own so we can
+        report which ones failed
+
+        @return (dict): paths of the assets that were saved, skipped as unchanged and that failed to save
+        """
+        result = dict(saved=[], skipped=[], failed=[])
+
+        assets = self.assets
+        self.assets = {}
+
+        if self.skip_unchanged:
+            dirty = {i.get_name() for i in unreal.EditorLoadingAndSavingUtils.get_dirty_content_packages()}
+
+            for path in list(assets):
+                if assets[path].get_outermost().get_name() not in dirty:
+                    result['skipped'].append(path)
+                    assets.pop(path)
+
+        if not assets:
+            return result
+
+        if unreal.EditorAssetLibrary.save_loaded_assets(list(assets.values()), self.skip_unchanged):
+            result['saved'].extend(assets)
+        else:
+            unreal.log_warning(f'Bulk save of {len(assets)} assets failed. Saving them one at a time')
+
+            for path, asset in assets.items():
+                if unreal.EditorAssetLibrary.save_loaded_asset(asset, self.skip_unchanged):
+                    result['saved'].append(path)
+                else:
+                    unreal.log_error(f'Failed to save {path}')
+                    result['failed'].append(path)
+
+        unreal.log(f"Saved {len(result['saved'])} assets, skipped {len(result['skipped'])} unchanged, "
+                   f"{len(result['failed'])} failed")
+
+        return result
+
+
+# the save session currently open, if any
+_save_session = None
+
+
+@contextmanager
+def save_session(skip_unchanged=True):
+    """
+    Holds back the saves the Bron classes make and saves everything in one go at the end. Sessions opened
+    inside another session join the outer one
+
+    @param skip_unchanged: (bool) If True assets that aren't dirty at the end are not saved
+    @return (SaveSession): the open session. Its flush result is stored on it as 'result' once closed
+    """
+    global _save_session
+
+    if _save_session:
+        yield _save_session
+        return
+
+    session = _save_session = SaveSession(skip_unchanged)
+    session.result = None
+
+    try:
+        yield session
+    finally:
+        _save_session = None
+        session.result = session.flush()
+
+
+def _save_asset(asset):
+    """
+    Saves an asset straight away, or registers it with the open save session to be saved at the end
+
+    @param asset: (unreal.Object) asset to save
+    @return (bool): False if the save failed
+    """
+    if _save_session:
+        _save_session.add(asset)
+        return True
+
+    return unreal.EditorAssetLibrary.save_loaded_asset(asset, True)
+
+
+# sequencer refreshes held back by open refresh scopes
+_refresh_depth = 0
+_refresh_pending = False
+refresh_stats = dict(requested=0, refreshed=0, suppressed=0)
+
+
+@contextmanager
+def refresh_scope():
+    """
+    Holds back sequencer refreshes until the outermost scope exits and then refreshes once if anything
+    asked for one. Can also be used as a decorator
+    """
+    global _refresh_depth, _refresh_pending
+
+    _refresh_depth += 1
+
+    try:
+        yield
+    finally:
+        _refresh_depth -= 1
+
+        if not _refresh_depth and _refresh_pending:
+            _refresh_pending = False
+            refresh_stats['refreshed'] += 1
+            unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+
+
+def request_refresh():
+    """
+    Refreshes the open level sequence, or leaves it to the end of the open refresh scope
+    """
+    global _refresh_pending
+
+    refresh_stats['requested'] += 1
+
+    if _refresh_depth:
+        # only the first request in a scope leads to a refresh
+        if _refresh_pending:
+            refresh_stats['suppressed'] += 1
+
+        _refresh_pending = True
+        return
+
+    refresh_stats['refreshed'] += 1
+    unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+
+
+def get_refresh_stats():
+    """
+    Gets how many sequencer refreshes were asked for, how many actually ran and how many were folded into
+    another refresh
+
+    @return (dict): requested, refreshed and suppressed counts
+    """
+    return dict(refresh_stats)
+
+
+# calls waiting to run on the game thread. Shotgrid event callbacks come in on the event watcher thread and
+# must not touch data the editor may be reading in the middle of an update
+_game_thread_calls = collections.deque()
+_game_thread_lock = threading.Lock()
+
+# drop the tick callback from a previous load of this module so a reload doesn't leave two running
+if globals().get('_game_thread_handle'):
+    unreal.unregister_slate_post_tick_callback(_game_thread_handle)
+_game_thread_handle = None
+
+
+def start_game_thread_calls():
+    """
+    Registers the tick callback that runs queued calls. Must be called from the game thread
+    """
+    global _game_thread_handle
+
+    if _game_thread_handle is None:
+        _game_thread_handle = unreal.register_slate_post_tick_callback(_run_game_thread_calls)
+
+
+def run_on_game_thread(func, *args):
+    """
+    Queues a function to run on the game thread after the next editor tick. Safe to call from any thread
+
+    @param func: (function) function to run
+    @param args: arguments to pass to the function
+    """
+    with _game_thread_lock:
+        _game_thread_calls.append((func, args))
+
+
+def _run_game_thread_calls(delta_time):
+    """
+    Tick callback that runs everything queued with run_on_game_thread
+    """
+    while True:
+        with _game_thread_lock:
+            if not _game_thread_calls:
+                return
+            func, args = _game_thread_calls.popleft()
+
+        try:
+            func(*args)
+        except Exception as e:
+            unreal.log_error(f'Queued call {getattr(func, "__name__", func)} failed: {e}')
+
 
 def _create_generic_asset(asset_path="", asset_class=None, asset_factory=None):
     """
@@ -176,7 +408,7 @@ def _create_generic_asset(asset_path="", asset_class=None, asset_factory=None):
             unreal.log_error(f'Failed to create asset {asset_path}')
             return None
 
-        unreal.EditorAssetLibrary.save_asset(dt.get_path_name(), True)
+        _save_asset(dt)
         return dt
     return unreal.load_asset(asset_path)
 
@@ -285,6 +517,10 @@ class BronSceneSequence(BronSequence):
     _sg_data = None
     _sg_shots = None
 
+    # cached shot sections and their frame ranges, built from the master track on first use
+    _ue_shot = None
+    _shot_ranges = None
+
     shot_data = {}
 
     _world = None
@@ -417,9 +653,75 @@ class BronSceneSequence(BronSequence):
     @property
     def ue_shot(self):
         """
-        Checks the scene sequence to see what shots are available
+        Checks the scene sequence to see what shots are available. The sections are only read from the
+        master track the first time and held until invalidate_shot_index is called
+
+        @return dict: Shot data with the section for each shot keyed by shot number
+        """
+        if self._ue_shot is None:
+            self._ue_shot = self._build_shot_index()
+
+        return self._ue_shot
+
+    @property
+    def shot_ranges(self):
+        """
+        Interval index over the shot sections in the scene sequence
 
-        @return list(Sections): List of all the shot sections on
+        @return list(tuple): (start frame, end frame, shot number) for each section sorted by start frame
+        """
+        if self._shot_ranges is None:
+            self._shot_ranges = sorted((data['section'].get_start_frame(), data['section'].get_end_frame(), shot)
+                                       for shot, data in self.ue_shot.items())
+
+        return self._shot_ranges
+
+    def invalidate_shot_index(self, ranges_only=False):
+        """
+        Drops the cached shot sections so they are read from the sequence again next time
+
+        @param ranges_only: (bool) If True only the frame ranges are dropped
+        """
+        self._shot_ranges = None
+
+        if not ranges_only:
+            self._ue_shot = None
+
+    def check_shot_ranges(self):
+        """
+        Walks the shot sections in frame order to find shots that overlap or leave gaps in the scene. Each
+        section is checked against the earlier section that reaches furthest into the scene
+
+        @return dict: overlaps and gaps as lists of (shot, next shot, start frame, end frame)
+        """
+        overlaps = []
+        gaps = []
+        furthest = None
+
+        for start, end, shot in self.shot_ranges:
+            if furthest:
+                last_end, last_shot = furthest
+
+                if start < last_end:
+                    overlaps.append((last_shot, shot, start, min(end, last_end)))
+                elif start > last_end:
+                    gaps.append((last_shot, shot, last_end, start))
+
+            if not furthest or end > furthest[0]:
+                furthest = (end, shot)
+
+        for overlap in overlaps:
+            unreal.log_warning('Shot {} overlaps shot {} from frame {} to {}'.format(*overlap))
+        for gap in gaps:
+            unreal.log_warning('Gap between shot {} and shot {} from frame {} to {}'.format(*gap))
+
+        return dict(overlaps=overlaps, gaps=gaps)
+
+    def _build_shot_index(self):
+        """
+        Reads the shot sections off the master shot track
+
+        @return dict: Shot data with the section for each shot keyed by shot number
         """
         shot_data = {}
         sections = []
@@ -469,10 +771,14 @@ class BronSceneSequence(BronSequence):
         return shot_data
 
     # ------ Callable functions
+    @refresh_scope()
     def update(self):
         """
         Will update the scene sequence to follow current data from shotgrid
         """
+        # sections may have been added or removed in sequencer since we last looked so read them fresh
+        self.invalidate_shot_index()
+
         # first lets make sure that we have a valid scene sequence and if not
         # lets create one
 
@@ -505,12 +811,14 @@ class BronSceneSequence(BronSequence):
 
         # # go through all valid shots and update/create them in the scene sequence
         updated_shots = []
+        shot_index = self.ue_shot
+
         for shot in self.sg_shots:
             shot_num = int(shot['code'].split('_')[-1])
 
             unreal.log(shot_num)
-            if shot_num in self.ue_shot:
-                section = self.ue_shot[shot_num]['section']
+            if shot_num in shot_index:
+                section = shot_index[shot_num]['section']
 
             else:
                 unreal.log('Shot not in master scene sequence')
@@ -525,6 +833,7 @@ class BronSceneSequence(BronSequence):
                 bron_shot.section = section
 
                 section.set_sequence(bron_shot.asset)
+                self.invalidate_shot_index()
 
             start_frame = round(shot['sg_edit_timecode_in'] * (self.frame_rate * 0.001))
             end_frame = round(shot['sg_edit_timecode_out'] * (self.frame_rate * 0.001))
@@ -549,6 +858,9 @@ class BronSceneSequence(BronSequence):
             if end_frame > out_frame:
                 out_frame = end_frame
 
+        # the section ranges have moved so the interval index needs rebuilding
+        self.invalidate_shot_index(ranges_only=True)
+
         # sets frame ranges
         self.asset.set_playback_start(in_frame)
         self.asset.set_playback_end(out_frame)
@@ -556,7 +868,39 @@ class BronSceneSequence(BronSequence):
         self.asset.set_view_range_start((in_frame - 20) / 24)
         self.asset.set_view_range_end((out_frame + 20) / 24)
 
-        unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+        request_refresh()
+
+    @refresh_scope()
+    def update_shots(self, force=False, dry_run=False):
+        """
+        Updates the shot sequences in this scene whose fingerprint no longer matches Shotgrid. The stored
+        fingerprints are read from the asset registry so shots that are up to date are never loaded
+
+        :param force: (bool) If True will update every shot whatever its fingerprint
+        :param dry_run: (bool) If True will only report which shots need updating
+        :return: (dict) Shot names that were updated and skipped, and the update plan for each updated shot
+        """
+        result = dict(updated=[], skipped=[], plans={})
+
+        # save all the shots together at the end
+        with save_session():
+            for shot in self.sg_shots:
+                bron_shot = BronShotSequence(self.episode, self.scene, int(shot['code'].split('_')[-1]), self.project)
+
+                # reuse the scene query rather than asking shotgrid for each shot again
+                bron_shot._sg_data = shot
+
+                if not force and bron_shot.exists and bron_shot.stored_fingerprint == bron_shot.fingerprint:
+                    result['skipped'].append(bron_shot.name)
+                    continue
+
+                result['updated'].append(bron_shot.name)
+                result['plans'][bron_shot.name] = bron_shot.update(dry_run=dry_run)
+
+        unreal.log(f"{len(result['updated'])} shots {'need updating' if dry_run else 'updated'}, "
+                   f"{len(result['skipped'])} already up to date")
+
+        return result
 
     # ## Helper functions
     def get_shot(self, shot_num):
@@ -569,6 +913,10 @@ class BronSceneSequence(BronSequence):
 class BronShotSequence(BronSequence):
     scene_sequence = None
 
+    # parts of the sequence update() checks and sets up, in the order they are applied
+    update_steps = ('display_rate', 'playback_range', 'view_range', 'folders', 'subscenes', 'camera', 'overrides',
+                    'fingerprint')
+
     section = None
 
     audio_track = None
@@ -591,6 +939,7 @@ class BronShotSequence(BronSequence):
 
     # shotgrid data
     _sg_data = {}
+    _sg_token = None
 
     # perforce
     _user = None
@@ -658,6 +1007,47 @@ class BronShotSequence(BronSequence):
 
         return self._sg_data
 
+    @property
+    def fingerprint(self):
+        """
+        Hash of the Shotgrid cut data and the override sequences that the shot sequence is built from. If
+        this matches the fingerprint stored on the sequence the shot doesn't need updating
+
+        :return: (str) Fingerprint for the current Shotgrid data
+        """
+        overrides = sorted((dpt, i['asset'], i['Group'], i['index'])
+                           for dpt, override_sequences in self._get_override_sequences().items()
+                           for i in override_sequences)
+
+        # everything the update reads from sg_data. The edit timecode sets the override offsets so a retime
+        # that keeps the same cut in and out still needs an update
+        data = dict(cut_in=self.sg_data['sg_cut_in'],
+                    cut_out=self.sg_data['sg_cut_out'],
+                    handles=self.sg_data['sg_handles'],
+                    preroll=self.sg_data['sg_preroll'] or 0,
+                    shot_group=self.sg_data['sg_shot_group'],
+                    edit_timecode_in=self.sg_data['sg_edit_timecode_in'],
+                    source_timecode_in=self.sg_data['sg_source_timecode_in'],
+                    status=self.sg_data['sg_status_list'],
+                    overrides=overrides)
+
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    @property
+    def stored_fingerprint(self):
+        """
+        Reads the fingerprint saved on the shot sequence from the asset registry without loading it
+
+        :return: (str) Stored fingerprint or None if the sequence doesn't have one
+        """
+        asset_reg = unreal.AssetRegistryHelpers.get_asset_registry()
+        asset_data = asset_reg.get_asset_by_object_path(_get_object_path(self.sequence_path))
+
+        if not asset_data or not asset_data.is_valid():
+            return None
+
+        return str(asset_data.get_tag_value(fingerprint_tag) or '') or None
+
     @property
     def user(self):
         """
@@ -1058,10 +1448,12 @@ class BronShotSequence(BronSequence):
 
         return template[self.project].format_map(data)
 
-    def _get_subscene_track(self, track_name):
+    def _find_subscene_track(self, track_name):
         """
-        Searches for a specific track within the sequence. If it can't find specified track will create
-        it and return the new track
+        Searches for a specific track within the sequence without creating it
+
+        :param track_name: (str) Display name of the track
+        :return: (unreal.MovieSceneSubTrack) Track or None if it doesn't exist
         """
         # get the subscene track
         tracks = self.asset.find_master_tracks_by_type(unreal.MovieSceneSubTrack)
@@ -1070,11 +1462,24 @@ class BronShotSequence(BronSequence):
             dptTag = track_name.split('_')[0]
             track_name = f"{dptTag}_Grp"
 
-        # make sure that we only have one
-        if not len(tracks) == 0:
-            for track in tracks:
-                if track.get_editor_property('display_name') == track_name:
-                    return track
+        for track in tracks:
+            if track.get_editor_property('display_name') == track_name:
+                return track
+
+        return None
+
+    def _get_subscene_track(self, track_name):
+        """
+        Searches for a specific track within the sequence. If it can't find specified track will create
+        it and return the new track
+        """
+        track = self._find_subscene_track(track_name)
+        if track:
+            return track
+
+        if "Grp" in track_name:
+            dptTag = track_name.split('_')[0]
+            track_name = f"{dptTag}_Grp"
 
         track = self.asset.add_master_track(unreal.MovieSceneSubTrack)
         track.set_editor_property('display_name', track_name)
@@ -1355,7 +1760,7 @@ class BronShotSequence(BronSequence):
                 params.set_editor_property('start_frame_offset', frame_number)
 
         # refresh open sequence so changes take effect
-        unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+        request_refresh()
 
     def _setup_camera(self) -> None:
         """
@@ -1398,17 +1803,86 @@ class BronShotSequence(BronSequence):
 
     # #########################
     # ------- Update functions
-    def update(self, create=True) -> None:
+    def plan_update(self) -> list:
         """
-        Updates the sequence for this shot context
+        Reads the current state of the shot sequence and works out what has to change to match the
+        Shotgrid cut data. Nothing in the sequence is changed
+
+        :return: (list) Steps to apply as dicts with the step name and the current and target state
+        """
+        if not self.sg_data['sg_preroll']:
+            self.sg_data['sg_preroll'] = 0
+
+        preroll = self.sg_data['sg_preroll']
+
+        # calculate start and end frames the sequence should have
+        start_frame = self.sg_data['sg_cut_in'] - self.sg_data['sg_handles']
+        end_frame = self.sg_data['sg_cut_out'] + self.sg_data['sg_handles']
+        view_range = (round((start_frame - preroll - 10) / 24, 4), round((end_frame + 10) / 24, 4))
+
+        # a new sequence needs everything set up
+        if not self.asset:
+            return [dict(step=step, current=None, target=None) for step in ('create',) + self.update_steps]
+
+        plan = []
+
+        def check(step, current, target):
+            if current != target:
+                plan.append(dict(step=step, current=current, target=target))
+
+        display_rate = self.asset.get_display_rate()
+        check('display_rate',
+              (display_rate.numerator, display_rate.denominator),
+              (self.frame_rate.numerator, self.frame_rate.denominator))
+        check('playback_range',
+              (self.asset.get_playback_start(), self.asset.get_playback_end()),
+              (start_frame, end_frame))
+        check('view_range',
+              (round(self.asset.get_view_range_start(), 4), round(self.asset.get_view_range_end(), 4)),
+              view_range)
+
+        folders = self.folders
+        check('folders', [i for i in get_departments() if i not in folders], [])
+        check('subscenes', self._get_stale_subscenes(start_frame, end_frame), [])
+        check('camera', self._get_camera_range(), (start_frame - preroll, end_frame + preroll))
+        check('overrides', self._get_stale_overrides(start_frame, end_frame), [])
+        check('fingerprint',
+              unreal.EditorAssetLibrary.get_metadata_tag(self.asset, fingerprint_tag) or None,
+              self.fingerprint)
+
+        return plan
+
+    @refresh_scope()
+    def update(self, create=True, dry_run=False) -> list:
+        """
+        Updates the sequence for this shot context. Only the parts of the sequence that don't match the
+        Shotgrid data are touched and the asset is only saved if something changed
 
         :param create: (bool) If the sequence doesn't exist do we want to create it?
-        :return:
+        :param dry_run: (bool) If True will only work out what needs to change
+        :return: (list) The update plan from plan_update
         """
         unreal.log('Update shot sequence')
 
+        if not self.asset and not create:
+            unreal.log_warning(f'Shot sequence for {self.name} does not exist')
+            return []
+
+        plan = self.plan_update()
+
+        if not plan:
+            unreal.log(f'{self.name} is up to date')
+            return plan
+
+        unreal.log(f"{self.name} needs updating: {', '.join(i['step'] for i in plan)}")
+
+        if dry_run:
+            return plan
+
+        steps = [i['step'] for i in plan]
+
         # if asset doesn't exist at all we want to create it
-        if not self.asset and create:
+        if 'create' in steps:
             unreal.log('### Could not find shot. Creating it!')
             self.asset = _create_generic_asset(asset_path=self.sequence_path,
                                                asset_class=unreal.LevelSequence,
@@ -1416,42 +1890,221 @@ class BronShotSequence(BronSequence):
 
             if self.asset is None:
                 unreal.log_error(f'Unable to create shot for {self.name}')
-                return
+                return plan
 
         # first we always want to make sure we ware working in 24fps
-        self.asset.set_display_rate(self.frame_rate)
+        if 'display_rate' in steps:
+            self.asset.set_display_rate(self.frame_rate)
 
-        # calculate start and end frames and set sequence with this values
         start_frame = self.sg_data['sg_cut_in'] - self.sg_data['sg_handles']
         end_frame = self.sg_data['sg_cut_out'] + self.sg_data['sg_handles']
 
-        self.asset.set_playback_start(start_frame)
-        self.asset.set_playback_end(end_frame)
-
-        if not self.sg_data['sg_preroll']:
-            self.sg_data['sg_preroll'] = 0
+        if 'playback_range' in steps:
+            self.asset.set_playback_start(start_frame)
+            self.asset.set_playback_end(end_frame)
 
         # set the viewport appropriately as well
-        self.asset.set_view_range_start((start_frame - self.sg_data['sg_preroll'] - 10) / 24)
-        self.asset.set_view_range_end((end_frame + 10) / 24)
+        if 'view_range' in steps:
+            self.asset.set_view_range_start((start_frame - self.sg_data['sg_preroll'] - 10) / 24)
+            self.asset.set_view_range_end((end_frame + 10) / 24)
 
         # setup sections of the sequence
-        self._setup_folders()
-        self._setup_subscenes()
-        self._setup_camera()
-        self._setup_overrides()
+        if 'folders' in steps:
+            self._setup_folders()
+        if 'subscenes' in steps:
+            self._setup_subscenes()
+        if 'camera' in steps:
+            self._setup_camera()
+        if 'overrides' in steps:
+            self._setup_overrides()
+
+        # only record what the sequence was built from if it now matches shotgrid. If a setup step
+        # couldn't finish the old fingerprint is left so the shot gets picked up again next time
+        remaining = [i['step'] for i in self.plan_update() if not i['step'] == 'fingerprint']
+
+        if remaining:
+            unreal.log_warning(f"{self.name} still needs updating after update: {', '.join(remaining)}")
+        else:
+            self.asset.modify()
+            unreal.EditorAssetLibrary.set_metadata_tag(self.asset, fingerprint_tag, self.fingerprint)
+
+        # save asset (or leave it to the open save session) and update current sequence
+        _save_asset(self.asset)
+        request_refresh()
 
-        # save asset and update current sequence
-        unreal.EditorAssetLibrary.save_loaded_asset(self.asset, True)
-        unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+        return plan
+
+    def _get_stale_subscenes(self, start_frame, end_frame) -> list:
+        """
+        Finds the department subscenes that are missing or don't line up with the given frame range
+
+        :param start_frame: (int) Playback start of the shot
+        :param end_frame: (int) Playback end of the shot
+        :return: (list) Departments that need their subscene set up
+        """
+        preroll = self.sg_data['sg_preroll']
+        display_rate = self.display_rate
+        target = (start_frame - preroll, end_frame, start_frame - preroll, end_frame,
+                  (display_rate.numerator, display_rate.denominator))
+
+        stale = []
+
+        for sub in get_departments():
+            track = self._find_subscene_track(f"{sub}_Shot")
+
+            subscene_data = dict(Project=self.project,
+                                 Episode=self.episode,
+                                 Scene=self.scene,
+                                 Shot=self.shot,
+                                 Dpt=sub)
+
+            sequence_path = bron_paths.sub_sequence[self.project].format_map(subscene_data)
+
+            sections = [i for i in self._get_subscene_sections(track) if i['sequence'] and
+                        i['sequence'].get_path_name() == sequence_path] if track else []
+
+            if not sections:
+                stale.append(sub)
+                continue
+
+            section = sections[0]['section']
+            subscene = sections[0]['sequence']
+            rate = subscene.get_display_rate()
+
+            current = (section.get_start_frame(), section.get_end_frame(),
+                       subscene.get_playback_start(), subscene.get_playback_end(),
+                       (rate.numerator, rate.denominator))
+
+            if current != target:
+                stale.append(sub)
+
+        return stale
+
+    def _get_camera_range(self):
+        """
+        Gets the frame range of the camera cut section
+
+        :return: (tuple) Start and end frame or None if there isn't a single camera cut section
+        """
+        tracks = self.asset.find_master_tracks_by_type(unreal.MovieSceneCameraCutTrack)
+        if not len(tracks) == 1:
+            return None
+
+        sections = tracks[0].get_sections()
+        if not len(sections) == 1:
+            return None
+
+        return sections[0].get_start_frame(), sections[0].get_end_frame()
+
+    def _get_stale_overrides(self, start_frame, end_frame) -> list:
+        """
+        Finds the override sequences that are missing from the shot or don't line up with the given
+        frame range
+
+        :param start_frame: (int) Playback start of the shot
+        :param end_frame: (int) Playback end of the shot
+        :return: (list) Paths of the override sequences that need setting up
+        """
+        preroll = self.sg_data['sg_preroll']
+        frame_offset = round((self.sg_data['sg_edit_timecode_in'] * 0.001) * 24) - \
+                       self.sg_data['sg_handles'] - preroll
+
+        dpts = get_departments()
+        stale = []
+
+        for dpt, override_sequences in self._get_override_sequences().items():
+            # invalid departments are skipped when setting up as well
+            if dpt not in dpts:
+                continue
+
+            for override_sequence in override_sequences:
+                track = self._find_subscene_track(f"{dpt}_{override_sequence['Group']}")
+
+                sections = [i for i in self._get_subscene_sections(track) if i['sequence'] and
+                            i['sequence'].get_path_name() == override_sequence['asset']] if track else []
+
+                if not sections:
+                    stale.append(override_sequence['asset'])
+                    continue
+
+                section = sections[0]['section']
+                start_offset = frame_offset - sections[0]['sequence'].get_playback_start()
+
+                current = (section.get_start_frame(),
+                           section.get_end_frame(),
+                           section.get_row_index(),
+                           section.parameters.start_frame_offset.value)
+
+                if current != (start_frame - preroll, end_frame, override_sequence['index'], start_offset * 1000):
+                    stale.append(override_sequence['asset'])
+
+        return stale
 
     def update_shotgrid_data(self):
         """
         Nullifies the sg data and refreshes it
         """
-        self._sg_data = {}
+        # skip the query cache as we always want the latest data here
+        self._sg_data = bron_shotgrid.get_entity(self.project, 'Shot', name=self.name, use_cache=False)
         return self.sg_data
 
+    def watch_shotgrid(self):
+        """
+        Listens for Shotgrid changes to this shot and keeps the sg data up to date. Needs the
+        bron_shotgrid event watcher to be running. Changes are applied on the game thread between ticks so
+        they never land part way through an update
+        """
+        if self._sg_token or not self.sg_data:
+            return
+
+        start_game_thread_calls()
+        self._sg_token = bron_shotgrid.subscribe('Shot', self._on_shotgrid_change, sg_id=self.sg_data['id'])
+
+    def unwatch_shotgrid(self):
+        """
+        Stops listening for Shotgrid changes to this shot
+        """
+        if self._sg_token:
+            bron_shotgrid.unsubscribe(self._sg_token)
+            self._sg_token = None
+
+    def _on_shotgrid_change(self, entity, sg_id, fields):
+        """
+        Refreshes the fields that changed in Shotgrid. Runs on the event watcher thread so the new data is
+        fetched here and handed to the game thread to swap in
+
+        :param entity: (str) Entity type that changed
+        :param sg_id: (int) id of the entity that changed
+        :param fields: (list) Fields that changed. If None the whole record is refreshed
+        """
+        # if we don't know what changed grab everything
+        if fields is None:
+            data = bron_shotgrid.get_entity(self.project, 'Shot', name=self.name, use_cache=False)
+            if data:
+                run_on_game_thread(self._apply_shotgrid_change, data, None)
+            return
+
+        # only refresh the fields we actually hold
+        fields = [i for i in fields if i in (self._sg_data or {})]
+        if not fields:
+            return
+
+        data = bron_shotgrid.get_entity_fields(entity, sg_id, fields)
+        if data:
+            run_on_game_thread(self._apply_shotgrid_change, {i: data.get(i) for i in fields}, fields)
+
+    def _apply_shotgrid_change(self, data, fields):
+        """
+        Swaps in new sg data in one go so nothing reading the old dict sees a mix of old and new values
+
+        :param data: (dict) New Shotgrid data
+        :param fields: (list) Fields to replace. If None data replaces the whole record
+        """
+        if fields is None:
+            self._sg_data = data
+        else:
+            self._sg_data = dict(self._sg_data or {}, **data)
+
     def update_shot_animations(self):
         """
         Updates all the the animation files and the camera
@@ -1665,7 +2318,7 @@ class BronShotSequence(BronSequence):
         #         print("could not find binding")
         #         chr_binding = anm_sequence['sequence'].add_spawnable_from_class(bp_asset)
 
-        unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+        request_refresh()
 
     def import_animations(self):
         """
@@ -2018,7 +2671,7 @@ class BronShotSequence(BronSequence):
             channels[4].set_default(item_data['rotation']['y'])
             channels[5].set_default(item_data['rotation']['z'])
 
-        unreal.LevelSequenceEditorBlueprintLibrary.refresh_current_level_sequence()
+        request_refresh()
 
 
 # todo: whole camera class needs to be updated to new methods. Keeping around as reference but can't call this
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from shotgun_api3.lib import mockgun
+
+from . import bron_paths, bron_shotgrid
+
+# mockgun mirrors a real site so it needs the schema pulled from one. Generate the files once with
+# mockgun.generate_schema(sg, schema_path, entity_schema_path) and point these at them
+schema_path = os.environ.get('BRON_MOCKGUN_SCHEMA')
+entity_schema_path = os.environ.get('BRON_MOCKGUN_ENTITY_SCHEMA')
+
+
+@unittest.skipUnless(schema_path and entity_schema_path,
+                     'BRON_MOCKGUN_SCHEMA and BRON_MOCKGUN_ENTITY_SCHEMA need setting to run against mockgun')
+class DownloadPlaylistTest(unittest.TestCase):
+    """
+    Checks how many Shotgrid round trips download_playlist takes against a mockgun site
+    """
+    def setUp(self):
+        mockgun.Shotgun.set_schema_paths(schema_path, entity_schema_path)
+        self.mock_sg = mockgun.Shotgun('https://bron.mockgun', 'test', 'key')
+
+        project = self.mock_sg.create('Project', {'name': 'Test'})
+        project = {'type': 'Project', 'id': project['id']}
+
+        # every movie is already on disk so nothing is downloaded, we are only counting the queries
+        self.movie_dir = tempfile.TemporaryDirectory()
+        self.versions = []
+
+        for i in range(300):
+            movie_path = os.path.join(self.movie_dir.name, f'v{i:03d}.mov')
+            open(movie_path, 'w').close()
+
+            version = self.mock_sg.create('Version', {'code': f'v{i:03d}',
+                                                      'project': project,
+                                                      'sg_path_to_movie': movie_path})
+            self.versions.append({'type': 'Version', 'id': version['id']})
+
+        self.mock_sg.create('Playlist', {'code': 'dailies', 'project': project, 'versions': self.versions})
+
+        # send everything to mockgun through the instrumentation so the round trips are counted
+        patches = [mock.patch.object(bron_shotgrid, 'sg', bron_shotgrid.InstrumentedShotgun(self.mock_sg)),
+                   mock.patch.object(bron_shotgrid, 'snapshot_store', None),
+                   mock.patch.dict(bron_paths.project_filters, GS=['project', 'is', project])]
+
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        bron_shotgrid.query_cache.invalidate()
+        self.addCleanup(bron_shotgrid.query_cache.invalidate)
+        self.addCleanup(self.movie_dir.cleanup)
+
+    def test_round_trips(self):
+        result = bron_shotgrid.download_playlist('GS', name='dailies')
+
+        self.assertEqual(result['round_trips'], 2)
+        self.assertEqual(len(result['skipped']), len(self.versions))
+
+    def test_cached_round_trips(self):
+        bron_shotgrid.download_playlist('GS', name='dailies')
+        result = bron_shotgrid.download_playlist('GS', name='dailies')
+
+        # a second run is answered from the query cache
+        self.assertEqual(result['round_trips'], 0)
+        self.assertEqual(len(result['skipped']), len(self.versions))
+
+
+if __name__ == '__main__':
+    unittest.main()